@@ -0,0 +1,100 @@
+"""Corpus-wide symbol queries over JSON symbol tables and a columnar export.
+
+The JSON path loads one ``get_source_program_symbol_table_as_json`` blob per
+file into dicts and walks them; the columnar path maps one export and
+queries its columns, vectorized with NumPy when it is installed. Both count
+the symbols of each kind and the symbols past line 20 of each file.
+
+    python -m benchmarks.bench_columnar [files] [functions per file]
+"""
+
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import Counter
+
+from benchmarks.corpus import generate_source_program
+from chakram.columnar import Corpus_Columns, export_corpus_columns
+from chakram.parser import get_source_program_symbol_table_as_json
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def query_json(blobs):
+    kinds = Counter()
+    late = Counter()
+    for file, blob in enumerate(blobs):
+        for entry in json.loads(blob).values():
+            kinds[entry["type"]] += 1
+            if entry["line"] > 20:
+                late[file] += 1
+    return dict(kinds), dict(late)
+
+
+def query_columns(location):
+    with Corpus_Columns(location, numpy=numpy is not None) as corpus:
+        kind, line, file = (
+            corpus["symbols.kind"],
+            corpus["symbols.line"],
+            corpus["symbols.file"],
+        )
+        if numpy is not None:
+            counts = numpy.bincount(kind, minlength=len(corpus.symbol_kinds))
+            late_counts = numpy.bincount(file[line > 20], minlength=len(corpus.files))
+            kinds = {
+                corpus.symbol_kinds[code]: int(count)
+                for code, count in enumerate(counts)
+                if count
+            }
+            late = {f: int(count) for f, count in enumerate(late_counts) if count}
+        else:
+            kinds = {corpus.symbol_kinds[k]: n for k, n in Counter(kind).items()}
+            late = dict(Counter(f for f, n in zip(file, line) if n > 20))
+        del kind, line, file
+        return kinds, late
+
+
+def measure(function, argument):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = function(argument)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+if __name__ == "__main__":
+    files = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    functions = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    with tempfile.TemporaryDirectory() as directory:
+        paths = []
+        blobs = []
+        for seed in range(files):
+            source = generate_source_program(functions, seed=seed)
+            paths.append(os.path.join(directory, f"{seed}.b"))
+            with open(paths[-1], "w") as file:
+                file.write(source)
+            blobs.append(get_source_program_symbol_table_as_json(source))
+        location = os.path.join(directory, "corpus.columns")
+        start = time.perf_counter()
+        export_corpus_columns(paths, location)
+        exported = time.perf_counter() - start
+
+        print(f"{files} files, export {exported:.2f}s, numpy={numpy is not None}")
+        print(
+            f"JSON {sum(map(len, blobs)) // 1024:,} KiB, "
+            f"columnar {os.path.getsize(location) // 1024:,} KiB"
+        )
+        print(f"{'path':<10}{'seconds':>10}{'peak KiB':>10}")
+        expected, elapsed, peak = measure(query_json, blobs)
+        print(f"{'json':<10}{elapsed:>10.4f}{peak // 1024:>10,}")
+        result, elapsed, peak = measure(query_columns, location)
+        print(f"{'columnar':<10}{elapsed:>10.4f}{peak // 1024:>10,}")
+        assert result == expected
@@ -0,0 +1,138 @@
+"""Performance and parity of grammar variants.
+
+Runs two or more grammar files over the examples and a generated corpus.
+The ASTs and symbol tables of every variant must equal those of the first
+grammar, the baseline, and per variant it reports the LALR(1) parse table
+size, the table build time, tokens/s of the parse and the AST transform
+time. Exits non-zero when a variant is not equivalent.
+
+    python -m benchmarks.bench_grammar [grammar ...] [-f functions] [-r repeat]
+
+The grammar of chakram is the baseline of a single grammar, and without
+grammars it is compared with itself.
+"""
+
+import argparse
+import glob
+import os
+import sys
+import time
+from typing import Callable, Dict, List, Tuple, TypeVar
+
+from benchmarks.corpus import generate_source_program
+from chakram import parser as chakram_parser
+from chakram.parser import Parser, _load_parser, _read_grammar
+from chakram.transformer import AST_Transformer
+
+GRAMMAR = f"{os.path.dirname(chakram_parser.__file__)}/grammar.lark"
+
+T = TypeVar("T")
+
+
+def build(grammar: str, repeat: int) -> Tuple[float, int, int]:
+    """Best table build time, and the number of states and of actions."""
+    text = _read_grammar(grammar)
+    timings = []
+    for _ in range(repeat):
+        chakram_parser._parsers.pop(text, None)
+        start = time.perf_counter()
+        lark = _load_parser(text)
+        timings.append(time.perf_counter() - start)
+    table = lark.parser.parser._parse_table
+    return min(timings), len(table.states), sum(map(len, table.states.values()))
+
+
+def count_tokens(grammar: str, source: str) -> int:
+    """Tokens the contextual lexer feeds the parser."""
+    interactive = _load_parser(_read_grammar(grammar)).parse_interactive(source)
+    state = interactive.parser_state
+    count = 0
+    for token in interactive.lexer_thread.lex(state):
+        count += 1
+        state.feed_token(token)
+    return count
+
+
+def results(grammar: str, source: str) -> Tuple:
+    """The AST and symbol table of a source program, or the error raised."""
+    try:
+        tree = Parser(source, grammar=grammar).get_parse_tree()
+        transformer = AST_Transformer(use_meta=True)
+        return transformer.transform(tree), transformer.get_symbol_table()
+    except Exception as e:
+        return (" ".join(f"{type(e).__name__}: {e}".split()),)
+
+
+def best(function: Callable[[], T], repeat: int) -> Tuple[float, T]:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+if __name__ == "__main__":
+    arguments = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    arguments.add_argument("grammars", nargs="*", metavar="GRAMMAR")
+    arguments.add_argument("-f", "--functions", type=int, default=200)
+    arguments.add_argument("-r", "--repeat", type=int, default=3)
+    args = arguments.parse_args()
+    grammars = args.grammars or [GRAMMAR, GRAMMAR]
+    if len(grammars) < 2:
+        grammars.insert(0, GRAMMAR)
+
+    corpus = generate_source_program(args.functions)
+    sources: Dict[str, str] = {"corpus": corpus}
+    examples = os.path.join(os.path.dirname(os.path.dirname(GRAMMAR)), "examples")
+    for path in sorted(glob.glob(f"{examples}/*.b")):
+        with open(path) as file:
+            sources[os.path.basename(path)] = file.read()
+
+    baseline = {name: results(grammars[0], source) for name, source in sources.items()}
+    mismatches: List[str] = []
+    print(f"{len(corpus):,} bytes of corpus, {len(sources) - 1} examples")
+    print(
+        f"{'grammar':<24}{'states':>8}{'actions':>9}{'build s':>9}{'tokens':>9}"
+        f"{'tokens/s':>11}{'transform s':>13}{'parity':>8}"
+    )
+    for number, grammar in enumerate(grammars):
+        label = f"{number}:{os.path.basename(grammar)}"[:23]
+        try:
+            built, states, actions = build(grammar, args.repeat)
+        except Exception as e:
+            print(f"{label:<24}{'-':>8}")
+            mismatches.append(f"{grammar}: " + " ".join(f"{e}".split()))
+            continue
+        different: Dict[str, str] = {}
+        for name, source in sources.items():
+            result, expected = results(grammar, source), baseline[name]
+            if len(result) == 1 or len(expected) == 1:
+                if result != expected:
+                    different[name] = result[0]
+            elif result[0] != expected[0]:
+                different[name] = "AST differs"
+            elif result[1] != expected[1]:
+                different[name] = "symbol table differs"
+        mismatches.extend(f"{grammar}: {name}: {why}" for name, why in different.items())
+
+        if "corpus" in different or len(baseline["corpus"]) == 1:
+            print(
+                f"{label:<24}{states:>8}{actions:>9}{built:>9.3f}{'-':>9}{'-':>11}"
+                f"{'-':>13}{len(different) or 'ok':>8}"
+            )
+            continue
+        tokens = count_tokens(grammar, corpus)
+        parsed, tree = best(
+            lambda: Parser(corpus, grammar=grammar).get_parse_tree(), args.repeat
+        )
+        transformed, _ = best(lambda: AST_Transformer().transform(tree), args.repeat)
+        print(
+            f"{label:<24}{states:>8}{actions:>9}{built:>9.3f}{tokens:>9,}"
+            f"{tokens / parsed:>11,.0f}{transformed:>13.3f}"
+            f"{'ok' if not different else len(different):>8}"
+        )
+
+    for mismatch in mismatches:
+        print(mismatch)
+    sys.exit(1 if mismatches else 0)
@@ -0,0 +1,37 @@
+"""Measure the interning mode of ``AST_Transformer``.
+
+Reports retained AST memory (tracemalloc), transform time and pickle size
+(pickle preserves sharing) for the plain and interned transforms.
+
+    python -m benchmarks.bench_intern [functions]
+"""
+
+import pickle
+import sys
+import time
+import tracemalloc
+
+from benchmarks.corpus import generate_source_program
+from chakram.parser import Parser
+from chakram.transformer import AST_Transformer
+
+
+def measure(tree, intern: bool):
+    tracemalloc.start()
+    start = time.perf_counter()
+    ast = AST_Transformer(intern=intern).transform(tree)
+    elapsed = time.perf_counter() - start
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return ast, retained, elapsed
+
+
+if __name__ == "__main__":
+    functions = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    tree = Parser(generate_source_program(functions)).get_parse_tree()
+    print(f"{'mode':<10}{'retained':>14}{'transform':>12}{'pickle':>14}")
+    for intern in (False, True):
+        ast, retained, elapsed = measure(tree, intern)
+        size = len(pickle.dumps(ast, protocol=pickle.HIGHEST_PROTOCOL))
+        mode = "interned" if intern else "plain"
+        print(f"{mode:<10}{retained:>12,} B{elapsed:>11.3f}s{size:>12,} B")
@@ -0,0 +1,49 @@
+"""Overhead of resource limit checks on ordinary input.
+
+    python -m benchmarks.bench_limits [functions] [repeat]
+"""
+
+import sys
+import time
+from typing import Any, Callable, List, Tuple
+
+from benchmarks.corpus import generate_source_program
+from chakram.limits import Resource_Limits
+from chakram.parser import get_source_program_as_ast, parse_source_program
+
+LIMITS: Resource_Limits = {
+    "bytes": 1 << 30,
+    "tokens": 1 << 30,
+    "depth": 1 << 20,
+    "nodes": 1 << 30,
+    "seconds": 3600.0,
+}
+
+
+def best(function, source: str, repeat: int) -> float:
+    function(source)  # warm the grammar tables
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(source)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+if __name__ == "__main__":
+    functions = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    source = generate_source_program(functions)
+    print(f"{len(source):,} bytes, best of {repeat}")
+    print(f"{'path':<28}{'unlimited':>11}{'limited':>10}{'overhead':>10}")
+    paths: List[Tuple[str, Callable[..., Any]]] = [
+        ("parse_source_program", parse_source_program),
+        ("get_source_program_as_ast", get_source_program_as_ast),
+    ]
+    for name, function in paths:
+        unlimited = best(function, source, repeat)
+        limited = best(lambda s: function(s, limits=LIMITS), source, repeat)
+        print(
+            f"{name:<28}{unlimited:>11.3f}{limited:>10.3f}"
+            f"{(limited / unlimited - 1) * 100:>9.1f}%"
+        )
@@ -0,0 +1,77 @@
+"""Peak RSS of building an AST versus input size.
+
+Each measurement runs in a fresh interpreter, as the peak resident set
+size of a process only grows. The current path reads the source into a
+string and holds the parse tree until the AST is built; the lean path maps
+the source file and frees the source and parse tree as they are consumed.
+Peaks are reported above the RSS of an interpreter with the grammar tables
+built.
+
+    python -m benchmarks.bench_memory [functions ...]
+"""
+
+import mmap
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+
+from benchmarks.corpus import generate_source_program
+
+PATHS = ["current", "lean"]
+
+
+def peak_rss_kib() -> int:
+    """Peak RSS of this process, ru_maxrss is in bytes on macOS."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+def measure(path: str, location: str) -> None:
+    from chakram.parser import get_source_program_as_ast
+
+    get_source_program_as_ast("main() { }")  # build the grammar tables
+    baseline = peak_rss_kib()
+    if path == "lean":
+        with open(location, "rb") as file:
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as source:
+                ast = get_source_program_as_ast(source, lean=True)
+    else:
+        with open(location) as file:
+            ast = get_source_program_as_ast(file.read())
+    print(baseline, peak_rss_kib(), len(ast["left"]))
+
+
+def run(path: str, location: str) -> int:
+    output = subprocess.run(
+        [sys.executable, "-m", "benchmarks.bench_memory", "--measure", path, location],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout.split()
+    return int(output[1]) - int(output[0])
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--measure"]:
+        measure(sys.argv[2], sys.argv[3])
+        sys.exit(0)
+
+    sizes = [int(arg) for arg in sys.argv[1:]] or [250, 500, 1000, 2000]
+    print(
+        f"{'functions':>10}{'source KiB':>12}{'current KiB':>13}"
+        f"{'lean KiB':>10}{'saved':>8}"
+    )
+    for functions in sizes:
+        with tempfile.NamedTemporaryFile("w", suffix=".b", delete=False) as file:
+            file.write(generate_source_program(functions))
+        try:
+            current, lean = (run(path, file.name) for path in PATHS)
+            size = os.path.getsize(file.name) // 1024
+        finally:
+            os.unlink(file.name)
+        print(
+            f"{functions:>10}{size:>12,}{current:>13,}{lean:>10,}"
+            f"{(1 - lean / current) * 100:>7.1f}%"
+        )
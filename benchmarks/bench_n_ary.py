@@ -0,0 +1,80 @@
+"""Measure the flattening mode of ``AST_Transformer`` on long operator chains.
+
+Each generated statement chains ``length`` names with one operator, i.e.
+``x = i + j + k + ...``. Reports transform time, retained AST memory
+(tracemalloc), dictionaries, depth and the time of a full walk for the
+binary and flattened ASTs. The binary form nests one level per operator,
+so the recursion limit is raised for it.
+
+    python -m benchmarks.bench_n_ary [length] [statements]
+"""
+
+import random
+import sys
+import time
+import tracemalloc
+
+from chakram.parser import Parser
+from chakram.transformer import AST_Transformer, expand_n_ary_expressions
+
+
+def generate_chain_program(length: int, statements: int, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    names = ["i", "j", "k", "n", "x", "y"]
+    body = []
+    for _ in range(statements):
+        operator = rng.choice(["+", "*", "&&", "||", "|", "&", "^"])
+        terms = [rng.choice(names) for _ in range(length)]
+        body.append(f"    x = {f' {operator} '.join(terms)};")
+    return "main() {\n    auto i, j, k, n, x, y;\n" + "\n".join(body) + "\n}\n"
+
+
+def walk(node, depth=1):
+    """Count dictionaries and maximum depth of an AST."""
+    if isinstance(node, list):
+        results = [walk(item, depth) for item in node]
+        return sum(r[0] for r in results), max((r[1] for r in results), default=depth)
+    if not isinstance(node, dict):
+        return 0, depth
+    count, deepest = 1, depth
+    for key in ("left", "right"):
+        if key in node:
+            nodes, level = walk(node[key], depth + 1)
+            count, deepest = count + nodes, max(deepest, level)
+    return count, deepest
+
+
+def measure(tree, flatten: bool):
+    start = time.perf_counter()
+    AST_Transformer(flatten=flatten).transform(tree)
+    elapsed = time.perf_counter() - start
+    # tracing allocations slows deep recursion, so memory is a second run
+    tracemalloc.start()
+    ast = AST_Transformer(flatten=flatten).transform(tree)
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    start = time.perf_counter()
+    nodes, depth = walk(ast)
+    return ast, retained, elapsed, nodes, depth, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    length = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    statements = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 10 * length + 1000))
+    tree = Parser(generate_chain_program(length, statements)).get_parse_tree()
+    print(f"{statements} statements of {length} terms")
+    print(
+        f"{'mode':<10}{'transform':>11}{'retained':>14}{'nodes':>9}"
+        f"{'depth':>7}{'walk':>9}"
+    )
+    results = {}
+    for flatten in (False, True):
+        ast, retained, elapsed, nodes, depth, walked = measure(tree, flatten)
+        results[flatten] = ast
+        mode = "flattened" if flatten else "binary"
+        print(
+            f"{mode:<10}{elapsed:>10.3f}s{retained:>12,} B{nodes:>9,}"
+            f"{depth:>7,}{walked:>8.3f}s"
+        )
+    assert expand_n_ary_expressions(results[True]) == results[False]
@@ -0,0 +1,62 @@
+"""Selector queries over the node index against a walk per question.
+
+Reports the transform time with and without indexing, then the time of
+answering the same queries by walking the AST each time and from the
+index.
+
+    python -m benchmarks.bench_query [functions] [repeat]
+"""
+
+import sys
+import time
+
+from benchmarks.corpus import generate_source_program
+from chakram.parser import Parser
+from chakram.transformer import AST_Transformer
+
+QUERIES = [
+    ("function_expression[f1]", "function_expression", "f1"),
+    ("assignment_expression", "assignment_expression", None),
+    ("statement[while]", "statement", "while"),
+    ("vector_lvalue[buf]", "vector_lvalue", "buf"),
+]
+
+
+def walk(node, kind, root, found):
+    if isinstance(node, list):
+        for item in node:
+            walk(item, kind, root, found)
+    elif isinstance(node, dict):
+        if node["node"] == kind and (root is None or node["root"] == root):
+            found.append(node)
+        for key in ("root", "left", "right"):
+            walk(node.get(key), kind, root, found)
+    return found
+
+
+def timed(function):
+    start = time.perf_counter()
+    result = function()
+    return result, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    functions = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    tree = Parser(generate_source_program(functions)).get_parse_tree()
+    ast, plain = timed(lambda: AST_Transformer().transform(tree))
+    transformer = AST_Transformer(index=True)
+    _, indexed = timed(lambda: transformer.transform(tree))
+    index = transformer.get_index()
+    assert index is not None
+    print(f"transform {plain:.3f}s, with index {indexed:.3f}s")
+    print(f"{'query':<28}{'matches':>8}{'walk':>10}{'index':>10}")
+    for selector, kind, root in QUERIES:
+        found, walked = timed(
+            lambda: [walk(ast, kind, root, []) for _ in range(repeat)][-1]
+        )
+        selected, looked_up = timed(
+            lambda: [index.select(selector) for _ in range(repeat)][-1]
+        )
+        assert len(found) == len(selected)
+        print(f"{selector:<28}{len(found):>8}{walked:>9.3f}s{looked_up:>9.4f}s")
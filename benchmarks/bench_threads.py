@@ -0,0 +1,42 @@
+"""Multi-threaded parse throughput.
+
+Parses the same set of generated programs with 1, 2, 4, ... threads that
+share the grammar tables. On a GIL build throughput stays flat; how it
+scales on a free-threaded build (i.e. python3.13t) has not been measured.
+
+    python -m benchmarks.bench_threads [programs] [max threads]
+"""
+
+import os
+import sys
+import sysconfig
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.corpus import generate_source_program
+from chakram.parser import get_source_program_as_ast
+
+
+if __name__ == "__main__":
+    programs = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else os.cpu_count() or 1
+    sources = [generate_source_program(10, seed=seed) for seed in range(programs)]
+    expected = [get_source_program_as_ast(source) for source in sources]
+
+    free_threaded = bool(sysconfig.get_config_var("Py_GIL_DISABLED"))
+    print(f"{sys.version.split()[0]} free-threaded={free_threaded} cpus={os.cpu_count()}")
+    print(f"{'threads':>8}{'seconds':>10}{'programs/s':>12}{'speedup':>9}")
+    baseline = None
+    count = 1
+    while count <= threads:
+        with ThreadPoolExecutor(max_workers=count) as executor:
+            start = time.perf_counter()
+            results = list(executor.map(get_source_program_as_ast, sources))
+            elapsed = time.perf_counter() - start
+        assert results == expected
+        baseline = baseline or elapsed
+        print(
+            f"{count:>8}{elapsed:>10.3f}{programs / elapsed:>12.1f}"
+            f"{baseline / elapsed:>8.2f}x"
+        )
+        count *= 2
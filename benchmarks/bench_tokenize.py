@@ -0,0 +1,37 @@
+"""Throughput of the token stream against the full parse and transform.
+
+    python -m benchmarks.bench_tokenize [functions]
+"""
+
+import sys
+import time
+
+from benchmarks.corpus import generate_source_program
+from chakram.parser import tokenize_source_program, parse_source_program
+from chakram.parser import get_source_program_as_ast
+
+
+def measure(function, source: str) -> float:
+    function(source)  # warm the grammar tables
+    start = time.perf_counter()
+    function(source)
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    functions = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    source = generate_source_program(functions)
+    tokens = sum(1 for _ in tokenize_source_program(source))
+    megabytes = len(source) / 1e6
+    print(f"{len(source):,} bytes, {tokens:,} tokens")
+    print(f"{'path':<28}{'seconds':>10}{'tokens/s':>14}{'MB/s':>8}")
+    for name, function in [
+        ("tokenize_source_program", lambda s: list(tokenize_source_program(s))),
+        ("parse_source_program", parse_source_program),
+        ("get_source_program_as_ast", get_source_program_as_ast),
+    ]:
+        elapsed = measure(function, source)
+        print(
+            f"{name:<28}{elapsed:>10.3f}{tokens / elapsed:>14,.0f}"
+            f"{megabytes / elapsed:>8.2f}"
+        )
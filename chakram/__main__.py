@@ -1,6 +1,11 @@
 if __name__ == "__main__":
     from chakram import parser
     from argparse import ArgumentParser
+    import logging
+    import sys
+
+    logging.basicConfig(level=logging.DEBUG)
+    sys.tracebacklimit = 0
 
     args_parser = ArgumentParser()
     args_parser.add_argument(
@@ -29,6 +34,33 @@ if __name__ == "__main__":
     args_parser.add_argument(
         "-m", "--meta", required=False, dest="meta", default=False, action="store_true"
     )
+    args_parser.add_argument(
+        "-n",
+        "--flatten",
+        required=False,
+        action="store_true",
+        dest="flatten",
+        default=False,
+        help="flatten runs of an associative operator to n-ary nodes",
+    )
+    args_parser.add_argument(
+        "-r",
+        "--ir",
+        required=False,
+        action="store_true",
+        dest="ir",
+        default=False,
+        help="emit three-address code IR",
+    )
+    args_parser.add_argument(
+        "-c",
+        "--check",
+        required=False,
+        action="store_true",
+        dest="check",
+        default=False,
+        help="report semantic errors and warnings",
+    )
     # for testing
     args_parser.add_argument(
         "-pt",
@@ -40,8 +72,91 @@ if __name__ == "__main__":
         help="get verbose parse tree",
     )
 
+    commands = args_parser.add_subparsers(dest="command")
+    index_parser = commands.add_parser(
+        "index", help="update and query a project symbol index"
+    )
+    index_parser.add_argument("directory", help="index B files below DIRECTORY")
+    index_parser.add_argument(
+        "-d", "--database", dest="database", default=".chakram.db", metavar="FILE"
+    )
+    index_parser.add_argument(
+        "--definitions", dest="definitions", metavar="NAME", help="where is NAME defined"
+    )
+    index_parser.add_argument(
+        "--references", dest="references", metavar="NAME", help="who references NAME"
+    )
+
+    export_parser = commands.add_parser(
+        "export", help="export columnar symbol tables of B files below DIRECTORY"
+    )
+    export_parser.add_argument("directory")
+    export_parser.add_argument(
+        "-o", "--output", dest="output", default="corpus.columns", metavar="FILE"
+    )
+
+    watch_parser = commands.add_parser(
+        "watch", help="re-parse B files below DIRECTORY as they change"
+    )
+    watch_parser.add_argument("directory")
+    watch_parser.add_argument(
+        "-o", "--output", dest="output", metavar="DIR", help="write results to DIR"
+    )
+    watch_parser.add_argument(
+        "-s", "--symbols", dest="symbols", action="store_true", default=False
+    )
+    watch_parser.add_argument(
+        "-m", "--meta", dest="meta", action="store_true", default=False
+    )
+    watch_parser.add_argument(
+        "-i", "--interval", dest="interval", type=float, default=0.5, metavar="SECONDS"
+    )
+
     args = args_parser.parse_args()
 
+    if args.command == "watch":
+        from chakram.watch import Watcher
+
+        watcher = Watcher(
+            args.directory, symbols=args.symbols, meta=args.meta, output=args.output
+        )
+        try:
+            watcher.run(interval=args.interval)
+        except KeyboardInterrupt:
+            exit(0)
+
+    if args.command == "index":
+        import json
+        from chakram.symbol_index import Symbol_Index
+
+        with Symbol_Index(args.database) as index:
+            for path in index.update_directory(args.directory):
+                print(f"indexed {path}")
+            if args.definitions:
+                print(json.dumps(index.definitions(args.definitions)))
+            if args.references:
+                print(json.dumps(index.references(args.references)))
+        exit(0)
+
+    if args.command == "export":
+        import os
+        from chakram.columnar import export_corpus_columns
+
+        paths = sorted(
+            os.path.join(root, name)
+            for root, _, files in os.walk(args.directory)
+            for name in files
+            if name.endswith(".b")
+        )
+        header = export_corpus_columns(paths, args.output)
+        for path, error in header["errors"].items():
+            print(f"{path}: {error}")
+        print(
+            f"exported {len(header['files'])} files, "
+            f"{header['columns']['symbols.file']['shape'][0]} symbols to {args.output}"
+        )
+        exit(0)
+
     with open(args.filename) as file:
         if args.symbols:
             print("Symbols:")
@@ -51,13 +166,43 @@ if __name__ == "__main__":
             else:
                 print(parser.get_source_program_symbol_table(file.read()))
                 exit(0)
+        if args.check:
+            import json
+
+            diagnostics = parser.get_source_program_diagnostics(file.read())
+            for diagnostic in diagnostics:
+                if args.json:
+                    print(json.dumps(diagnostic))
+                else:
+                    print(
+                        f"{args.filename}:{diagnostic['line']}:{diagnostic['column']}: "
+                        f"{diagnostic['severity']}: {diagnostic['message']} "
+                        f"[{diagnostic['code']}]"
+                    )
+            exit(1 if any(d["severity"] == "error" for d in diagnostics) else 0)
+        if args.ir:
+            if args.json:
+                print(parser.get_source_program_ir_as_json(file.read()))
+            else:
+                from chakram.ir import format_ir
+
+                print(format_ir(parser.get_source_program_as_ir(file.read())))
+            exit(0)
         if args.pt:
             print(
                 parser.parse_source_program_as_string(file.read(), pretty=args.pretty)
             )
             exit(0)
         elif args.json:
-            print(parser.get_source_program_ast_as_json(file.read(), meta=args.meta))
+            print(
+                parser.get_source_program_ast_as_json(
+                    file.read(), meta=args.meta, flatten=args.flatten
+                )
+            )
             exit(0)
         else:
-            print(parser.get_source_program_ast_as_string(file.read(), meta=args.meta))
+            print(
+                parser.get_source_program_ast_as_string(
+                    file.read(), meta=args.meta, flatten=args.flatten
+                )
+            )
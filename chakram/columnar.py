@@ -0,0 +1,310 @@
+from __future__ import annotations
+from array import array
+from lark import exceptions
+from chakram.parser import Parser
+from chakram.transformer import AST_Transformer, AST_Node
+from typing import Any, Dict, Iterable, List, Literal, Tuple, TypedDict
+import importlib
+import json
+import mmap
+import struct
+import sys
+
+
+""" Magic number and version of the columnar file layout. """
+MAGIC = b"CHAKRAMC"
+VERSION = 1
+
+""" Offset alignment of the header end and of every column, in bytes. """
+ALIGNMENT = 64
+
+_PREAMBLE = struct.Struct("<8sII")
+
+""" NumPy dtype of each array typecode, in little-endian order. """
+_DTYPES = {"B": "<u1", "i": "<i4", "I": "<u4"}
+
+""" memoryview format of each array typecode. """
+_FORMATS: Dict[str, Literal["B", "i", "I"]] = {"B": "B", "i": "i", "I": "I"}
+
+""" Symbol table keys that are stored as int32 columns, -1 when absent. """
+_POSITIONS = ("line", "column", "start_pos", "end_pos")
+
+
+class Column(TypedDict):
+    """Location of one column in a columnar file"""
+
+    typecode: str
+    dtype: str
+    offset: int
+    shape: List[int]
+
+
+class Columnar_Header(TypedDict):
+    """JSON header of a columnar file, the string tables and its columns"""
+
+    version: int
+    byteorder: str
+    files: List[str]
+    errors: Dict[str, str]
+    names: List[str]
+    symbol_kinds: List[str]
+    node_kinds: List[str]
+    columns: Dict[str, Column]
+
+
+class _Column_Builder:
+    """String tables and growing arrays of a corpus export."""
+
+    def __init__(self) -> None:
+        self.strings: Dict[str, Dict[str, int]] = {
+            "names": {},
+            "symbol_kinds": {},
+            "node_kinds": {},
+        }
+        self.symbols: Dict[str, array] = {
+            "file": array("i"),
+            "name": array("i"),
+            "kind": array("B"),
+            **{key: array("i") for key in _POSITIONS},
+        }
+        self.functions: Dict[str, array] = {
+            "file": array("i"),
+            "name": array("i"),
+            "nodes": array("I"),
+        }
+        self.node_counts: List[Dict[int, int]] = []
+
+    def intern(self, table: str, value: str) -> int:
+        ids = self.strings[table]
+        if value not in ids:
+            ids[value] = len(ids)
+        return ids[value]
+
+    def add_source_program(self, file: int, source_program: bytes) -> None:
+        transformer = AST_Transformer(use_meta=True, consume=True)
+        ast = transformer.transform(
+            Parser(source_program, lean=True).release_parse_tree()
+        )
+        for name, entry in transformer.get_symbol_table().items():
+            self.symbols["file"].append(file)
+            self.symbols["name"].append(self.intern("names", name))
+            self.symbols["kind"].append(
+                self.intern("symbol_kinds", str(entry.get("type")))
+            )
+            for key in _POSITIONS:
+                value = entry.get(key)
+                self.symbols[key].append(-1 if value is None else value)  # type: ignore
+        for definition in ast["left"]:
+            if definition["node"] != "function_definition":
+                continue
+            counts = self.__count_node_kinds(definition)
+            self.functions["file"].append(file)
+            self.functions["name"].append(self.intern("names", str(definition["root"])))
+            self.functions["nodes"].append(sum(counts.values()))
+            self.node_counts.append(counts)
+
+    def __count_node_kinds(self, definition: AST_Node) -> Dict[int, int]:
+        counts: Dict[int, int] = {}
+        pending: List[Any] = [definition]
+        while pending:
+            value = pending.pop()
+            if isinstance(value, dict):
+                kind = self.intern("node_kinds", str(value["node"]))
+                counts[kind] = counts.get(kind, 0) + 1
+                pending.extend((value["root"], value.get("left"), value.get("right")))
+            elif isinstance(value, list):
+                pending.extend(value)
+        return counts
+
+    def columns(self) -> List[Tuple[str, array, List[int]]]:
+        """Every column as (name, array, shape), node counts row-major."""
+        width = len(self.strings["node_kinds"])
+        node_counts = array("I", bytes(4 * width * len(self.node_counts)))
+        for row, counts in enumerate(self.node_counts):
+            for kind, count in counts.items():
+                node_counts[row * width + kind] = count
+        columns = [
+            (f"symbols.{key}", values, [len(values)])
+            for key, values in self.symbols.items()
+        ]
+        columns.extend(
+            (f"functions.{key}", values, [len(values)])
+            for key, values in self.functions.items()
+        )
+        columns.append(
+            ("functions.node_counts", node_counts, [len(self.node_counts), width])
+        )
+        return columns
+
+
+def _align(offset: int) -> int:
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def export_corpus_columns(paths: Iterable[str], location: str) -> Columnar_Header:
+    """Export the symbols and per function node kind counts of a corpus
+
+    The columns are written as arrays after a JSON header, each aligned to
+    64 bytes, so that ``Corpus_Columns`` maps them without a copy:
+
+    - ``symbols.*``: one row per symbol table entry of every file: file and
+      name ids, kind code, and line, column, start_pos and end_pos (-1 when
+      unknown)
+    - ``functions.*``: one row per function definition: file and name ids,
+      the number of AST nodes, and ``node_counts``, a (functions, node
+      kinds) matrix
+
+    Ids index the string tables of the header. A file that does not parse
+    keeps its id, with its error in ``errors``.
+
+    Args:
+        paths: Paths of B source files
+        location: Path of the columnar file to write
+
+    Returns:
+        The header that was written
+
+    """
+    builder = _Column_Builder()
+    files: List[str] = []
+    errors: Dict[str, str] = {}
+    for path in paths:
+        files.append(path)
+        with open(path, "rb") as file:
+            source_program = file.read()
+        try:
+            builder.add_source_program(len(files) - 1, source_program)
+        except (exceptions.UnexpectedInput, UnicodeDecodeError) as e:
+            errors[path] = f"{e}"
+
+    columns = builder.columns()
+    header: Columnar_Header = {
+        "version": VERSION,
+        "byteorder": "little",
+        "files": files,
+        "errors": errors,
+        **{table: list(ids) for table, ids in builder.strings.items()},  # type: ignore
+        "columns": {},
+    }
+    # offsets are relative to the end of the header, which they do not change
+    offset = 0
+    for name, values, shape in columns:
+        header["columns"][name] = {
+            "typecode": values.typecode,
+            "dtype": _DTYPES[values.typecode],
+            "offset": offset,
+            "shape": shape,
+        }
+        offset = _align(offset + len(values) * values.itemsize)
+    encoded = json.dumps(header).encode("utf-8")
+    start = _align(_PREAMBLE.size + len(encoded))
+    with open(location, "wb") as file:
+        file.write(_PREAMBLE.pack(MAGIC, VERSION, len(encoded)))
+        file.write(encoded.ljust(start - _PREAMBLE.size, b" "))
+        for name, values, _ in columns:
+            if sys.byteorder != "little":
+                values.byteswap()
+            file.seek(start + header["columns"][name]["offset"])
+            file.write(values.tobytes())
+        # a trailing empty column still lies within the file
+        file.truncate(start + offset)
+    return header
+
+
+class Corpus_Columns:
+    """Columns of a corpus export, mapped from the file without a copy.
+
+    Columns are ``memoryview`` casts of the mapped file, or NumPy arrays
+    over it with ``numpy=True``, for vectorized corpus-wide queries:
+
+        with Corpus_Columns("corpus.columns", numpy=True) as corpus:
+            kinds = corpus["symbols.kind"]
+            functions = kinds == corpus.symbol_kinds.index("function_definition")
+
+    On a big-endian host the columns are copied and swapped instead.
+
+    Args:
+        location: Path of a file written by ``export_corpus_columns``
+        numpy: Return NumPy arrays, which requires NumPy
+
+    Attributes:
+        header: The header of the file.
+
+    """
+
+    def __init__(self, location: str, numpy=False) -> None:
+        self._numpy: Any = None
+        if numpy:
+            self._numpy = importlib.import_module("numpy")
+        with open(location, "rb") as file:
+            self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, size = _PREAMBLE.unpack_from(self._map)
+        if magic != MAGIC or version != VERSION:
+            self._map.close()
+            raise ValueError(f"{location} is not a version {VERSION} columnar file")
+        encoded = slice(_PREAMBLE.size, _PREAMBLE.size + size)
+        self.header: Columnar_Header = json.loads(self._map[encoded])
+        self._start = _align(_PREAMBLE.size + size)
+        self._views: Dict[str, Any] = {}
+
+    @property
+    def files(self) -> List[str]:
+        return self.header["files"]
+
+    @property
+    def names(self) -> List[str]:
+        return self.header["names"]
+
+    @property
+    def symbol_kinds(self) -> List[str]:
+        return self.header["symbol_kinds"]
+
+    @property
+    def node_kinds(self) -> List[str]:
+        return self.header["node_kinds"]
+
+    def columns(self) -> List[str]:
+        return list(self.header["columns"])
+
+    def __getitem__(self, name: str) -> Any:
+        if name not in self._views:
+            self._views[name] = self.__load(self.header["columns"][name])
+        return self._views[name]
+
+    def __load(self, column: Column) -> Any:
+        count = 1
+        for dimension in column["shape"]:
+            count *= dimension
+        offset = self._start + column["offset"]
+        if self._numpy is not None:
+            values = self._numpy.frombuffer(
+                self._map, dtype=column["dtype"], count=count, offset=offset
+            )
+            return values.reshape(column["shape"])
+        end = offset + count * array(column["typecode"]).itemsize
+        view = memoryview(self._map)[offset:end]
+        if sys.byteorder != "little":
+            values = array(column["typecode"], view)
+            values.byteswap()
+            view = memoryview(values)
+        typecode = _FORMATS[column["typecode"]]
+        if count == 0:
+            return view.cast(typecode)
+        return view.cast(typecode, column["shape"])
+
+    def close(self) -> None:
+        for view in self._views.values():
+            if isinstance(view, memoryview):
+                view.release()
+        self._views = {}
+        try:
+            self._map.close()
+        except BufferError:
+            # arrays handed out still map the file, which closes when they are freed
+            pass
+
+    def __enter__(self) -> Corpus_Columns:
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
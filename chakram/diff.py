@@ -0,0 +1,142 @@
+from __future__ import annotations
+from lark import exceptions
+from chakram.parser import Parser, Syntax_Error
+from chakram.transformer import AST_Transformer, AST_Node, Symbol_Table, _Meta
+from chakram.transformer import structural_hash
+from typing import TypedDict, Dict, List, Literal, Optional
+from typing import NotRequired
+
+
+class Symbol_Change(TypedDict):
+    """A symbol table entry that was added, removed or changed"""
+
+    name: str
+    change: Literal["added", "removed", "modified"]
+    old: NotRequired[_Meta]
+    new: NotRequired[_Meta]
+
+
+class AST_Diff(TypedDict):
+    """Top-level definitions and symbols that differ between two programs"""
+
+    added: List[str]
+    removed: List[str]
+    modified: List[str]
+    unchanged: List[str]
+    symbols: List[Symbol_Change]
+
+
+""" Symbol table keys of source positions, which a diff ignores. """
+_POSITIONS = frozenset(("line", "column", "start_pos", "end_pos", "end_column"))
+
+
+def definition_hashes(ast: AST_Node) -> Dict[str, str]:
+    """Structural hash of each top-level definition of an AST.
+
+    For ASTs not built in the hashing mode of ``AST_Transformer``, which
+    records the same hashes during transformation.
+    """
+    return {str(node["root"]): structural_hash(node) for node in ast["left"]}
+
+
+def diff_definitions(
+    old_hashes: Dict[str, str],
+    new_hashes: Dict[str, str],
+    old_symbol_table: Optional[Symbol_Table] = None,
+    new_symbol_table: Optional[Symbol_Table] = None,
+) -> AST_Diff:
+    """Diff two programs by the structural hashes of their definitions.
+
+    Hashes of a previous build can be kept and diffed against the new ones
+    without the previous AST. Symbol table entries are compared without
+    their source positions.
+
+    Args:
+        old_hashes: Definition hashes of the old program
+        new_hashes: Definition hashes of the new program
+        old_symbol_table: Optional Symbol Table of the old program
+        new_symbol_table: Optional Symbol Table of the new program
+
+    Returns:
+        Added, removed, modified and unchanged definitions, in source order,
+        and the changed symbol table entries
+
+    """
+    diff: AST_Diff = {
+        "added": [],
+        "removed": [name for name in old_hashes if name not in new_hashes],
+        "modified": [],
+        "unchanged": [],
+        "symbols": [],
+    }
+    for name, digest in new_hashes.items():
+        if name not in old_hashes:
+            diff["added"].append(name)
+        elif old_hashes[name] != digest:
+            diff["modified"].append(name)
+        else:
+            diff["unchanged"].append(name)
+
+    old_symbols = old_symbol_table or {}
+    new_symbols = new_symbol_table or {}
+    for name, entry in old_symbols.items():
+        if name not in new_symbols:
+            diff["symbols"].append({"name": name, "change": "removed", "old": entry})
+    for name, entry in new_symbols.items():
+        if name not in old_symbols:
+            diff["symbols"].append({"name": name, "change": "added", "new": entry})
+        elif _semantic_entry(old_symbols[name]) != _semantic_entry(entry):
+            diff["symbols"].append(
+                {
+                    "name": name,
+                    "change": "modified",
+                    "old": old_symbols[name],
+                    "new": entry,
+                }
+            )
+    return diff
+
+
+def diff_asts(
+    old_ast: AST_Node,
+    new_ast: AST_Node,
+    old_symbol_table: Optional[Symbol_Table] = None,
+    new_symbol_table: Optional[Symbol_Table] = None,
+) -> AST_Diff:
+    """Diff the top-level definitions and symbols of two ASTs"""
+    return diff_definitions(
+        definition_hashes(old_ast),
+        definition_hashes(new_ast),
+        old_symbol_table,
+        new_symbol_table,
+    )
+
+
+def diff_source_programs(old_source_program: str, new_source_program: str) -> AST_Diff:
+    """Diff the top-level definitions and symbols of two B programs
+
+    Args:
+        old_source_program: The old source B program as a string
+        new_source_program: The new source B program as a string
+
+    Returns:
+        The AST diff
+
+    """
+    old = AST_Transformer(use_meta=True, hashes=True)
+    new = AST_Transformer(use_meta=True, hashes=True)
+    try:
+        old.transform(Parser(old_source_program).get_parse_tree())
+        new.transform(Parser(new_source_program).get_parse_tree())
+    except (exceptions.UnexpectedToken, exceptions.ParseError) as e:
+        raise Syntax_Error(f"{e}") from None
+    return diff_definitions(
+        old.get_definition_hashes(),
+        new.get_definition_hashes(),
+        old.get_symbol_table(),
+        new.get_symbol_table(),
+    )
+
+
+def _semantic_entry(entry: _Meta) -> Dict:
+    return {key: value for key, value in entry.items() if key not in _POSITIONS}
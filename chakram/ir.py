@@ -0,0 +1,623 @@
+from __future__ import annotations
+from array import array
+from enum import IntEnum
+from lark import Transformer, Discard, Token, Tree
+from lark.exceptions import VisitError
+from chakram.limits import Resource_Limits, Resource_Limit_Error, _Budget, CLOCK_INTERVAL
+from typing import TypedDict, Union, List, NamedTuple, Optional, Tuple, Dict
+
+
+class Op(IntEnum):
+    """Three-address code opcodes.
+
+    Every instruction is the quadruple ``(op, dest, a, b)`` of operands.
+    Branch targets are always stored in the ``dest`` slot.
+    """
+
+    NOP = 0
+    MOV = 1  # dest = a
+    LOAD = 2  # dest = *a
+    STORE = 3  # *dest = a
+    INDEX = 4  # dest = a[b]
+    STORE_INDEX = 5  # dest[a] = b
+    ADDR = 6  # dest = &a
+    NEG = 7
+    NOT = 8
+    COMPL = 9
+    ADD = 10
+    SUB = 11
+    MUL = 12
+    DIV = 13
+    MOD = 14
+    LSHIFT = 15
+    RSHIFT = 16
+    BIT_AND = 17
+    BIT_OR = 18
+    XOR = 19
+    EQ = 20
+    NE = 21
+    LT = 22
+    LE = 23
+    GT = 24
+    GE = 25
+    PARAM = 26  # push a
+    CALL = 27  # dest = a(...) with b parameters
+    RETURN = 28  # return a
+    LABEL = 29
+    JUMP = 30
+    JUMP_FALSE = 31  # if !a goto dest
+    JUMP_TRUE = 32  # if a goto dest
+    JUMP_EQ = 33  # if a == b goto dest
+    AUTO = 34  # auto dest[a]
+    EXTRN = 35  # extrn dest
+    BREAK = 36  # unresolved break outside of while or switch
+
+
+class Operand(IntEnum):
+    """Operand kinds, stored in the low bits of an encoded operand.
+
+    An encoded operand is ``(value << 3) | kind``, where value is a temporary
+    number, an index into the string or constant table, or an immediate
+    integer. Integer literals too large for an immediate are constants. The
+    encoded operand ``0`` is the empty operand.
+    """
+
+    NONE = 0
+    TEMP = 1
+    NAME = 2
+    INT = 3
+    CONST = 4
+    LABEL = 5
+
+
+_SHIFT = 3
+
+_MASK = (1 << _SHIFT) - 1
+
+""" Largest immediate whose encoding fits the signed 64-bit code array. """
+_MAX_IMMEDIATE = (1 << (63 - _SHIFT)) - 1
+
+
+def operand_kind(operand: int) -> Operand:
+    return Operand(operand & _MASK)
+
+
+def operand_value(operand: int) -> int:
+    return operand >> _SHIFT
+
+
+class IR_Function(TypedDict):
+    """A function as flat (op, dest, a, b) quadruples"""
+
+    name: int
+    parameters: List[int]
+    temporaries: int
+    code: array
+
+
+class IR_Vector(TypedDict):
+    """A global vector definition"""
+
+    name: int
+    size: int
+    values: List[int]
+
+
+class IR_Program(TypedDict):
+    """The IR data structure"""
+
+    strings: List[str]
+    constants: List[Union[str, float]]
+    vectors: List[IR_Vector]
+    functions: List[IR_Function]
+
+
+Code = List[int]
+
+""" Lvalue places: ("name", name), ("deref", pointer) or ("index", base, index). """
+Place = Tuple[int, ...]
+
+_NAME_PLACE, _DEREF_PLACE, _INDEX_PLACE = 0, 1, 2
+
+
+class _Fragment:
+    """Code of an expression and the operand holding its value.
+
+    Lvalues are kept as a place until their use is known, so that the same
+    fragment lowers to a load when read and to a store when assigned.
+    """
+
+    __slots__ = ("code", "operand", "place")
+
+    def __init__(
+        self, code: Code, operand: Optional[int], place: Optional[Place] = None
+    ) -> None:
+        self.code = code
+        self.operand = operand
+        self.place = place
+
+
+class _Value(NamedTuple):
+    """Code of an expression and the operand that holds its value."""
+
+    code: Code
+    operand: int
+
+
+class IR_Transformer(Transformer):
+    """
+    Three-address code transformer.
+
+    Lower a parse tree directly into a flat, array-backed three-address code
+    IR without building the intermediate AST. Each function is a single
+    ``array("q")`` of (op, dest, a, b) quadruples over encoded operands, with
+    names and labels in a program string table and non-integer literals in
+    a constant table. ``&&`` and ``||`` are lowered with short-circuit jumps.
+
+    With resource limits the ``seconds`` budget is checked as the parse tree
+    is lowered, and its clock starts when the transformer is created. The
+    ``nodes`` budget counts AST nodes, which the IR does not construct.
+    """
+
+    def __init__(self, limits: Optional[Resource_Limits] = None):
+        self._strings: List[str] = []
+        self._string_ids: Dict[str, int] = {}
+        self._constants: List[Union[str, float]] = []
+        self._constant_ids: Dict[Union[str, float], int] = {}
+        self._temporaries = 0
+        self._labels = 0
+        self._budget = _Budget(limits) if limits else None
+        self._lowered = 0
+        if self._budget is not None:
+            # bound only with limits, the default path pays no extra call
+            self._transform_tree = self.__transform_limited_tree  # type: ignore
+        super().__init__()
+
+    def transform(self, tree: Tree) -> IR_Program:
+        """Lower a parse tree, raising exceeded resource limits as is."""
+        try:
+            return super().transform(tree)
+        except VisitError as e:
+            if isinstance(e.orig_exc, Resource_Limit_Error):
+                raise e.orig_exc from None
+            if isinstance(e.orig_exc, RecursionError) and self._budget is not None:
+                raise self._budget.depth_exceeded() from None
+            raise
+        except RecursionError:
+            if self._budget is None:
+                raise
+            raise self._budget.depth_exceeded() from None
+
+    def __transform_limited_tree(self, tree: Tree):
+        """Lark tree transform with resource limits, bound in __init__."""
+        self._lowered += 1
+        if self._lowered % CLOCK_INTERVAL == 0:
+            self._budget.check_clock()  # type: ignore
+        return super()._transform_tree(tree)
+
+    """ Binary operator opcodes. """
+    operator_map = {
+        "bit_or_operator": Op.BIT_OR,
+        "bit_and_operator": Op.BIT_AND,
+        "eq_operator": Op.EQ,
+        "neq_oeprator": Op.NE,
+        "lt_operator": Op.LT,
+        "lte_operator": Op.LE,
+        "gt_operator": Op.GT,
+        "gte_operator": Op.GE,
+        "xor_operator": Op.XOR,
+        "lshift_operator": Op.LSHIFT,
+        "rshift_operator": Op.RSHIFT,
+        "sub_operator": Op.SUB,
+        "add_operator": Op.ADD,
+        "mod_operator": Op.MOD,
+        "mul_operator": Op.MUL,
+        "div_operator": Op.DIV,
+    }
+
+    """ Unary operator opcodes. """
+    unary_operator_map = {
+        "unary_minus": Op.NEG,
+        "unary_plus": Op.MOV,
+        "unary_not": Op.NOT,
+        "unary_ones_complement": Op.COMPL,
+    }
+
+    """ Operand factories. """
+
+    def __string(self, value: str) -> int:
+        if value not in self._string_ids:
+            self._string_ids[value] = len(self._strings)
+            self._strings.append(value)
+        return self._string_ids[value]
+
+    def __name(self, name: str) -> int:
+        return self.__string(str(name)) << _SHIFT | Operand.NAME
+
+    def __constant(self, value: Union[str, float]) -> int:
+        # key on type as well, so that 1.0 and "1.0" stay distinct
+        key = (type(value), value)
+        if key not in self._constant_ids:
+            self._constant_ids[key] = len(self._constants)  # type: ignore
+            self._constants.append(value)
+        return self._constant_ids[key] << _SHIFT | Operand.CONST  # type: ignore
+
+    def __temporary(self) -> int:
+        self._temporaries += 1
+        return (self._temporaries - 1) << _SHIFT | Operand.TEMP
+
+    def __label(self, name: Optional[str] = None) -> int:
+        if name is None:
+            self._labels += 1
+            name = f".L{self._labels - 1}"
+        return self.__string(name) << _SHIFT | Operand.LABEL
+
+    @staticmethod
+    def __immediate(value: int) -> int:
+        return value << _SHIFT | Operand.INT
+
+    """ Lvalue places. """
+
+    def __value(self, fragment: _Fragment) -> _Value:
+        """Read the value of a fragment, loading from its place if needed."""
+        if fragment.operand is not None:
+            return _Value(fragment.code, fragment.operand)
+        assert fragment.place is not None
+        temporary = self.__temporary()
+        if fragment.place[0] == _DEREF_PLACE:
+            load = [Op.LOAD, temporary, fragment.place[1], 0]
+        else:
+            load = [Op.INDEX, temporary, fragment.place[1], fragment.place[2]]
+        return _Value(fragment.code + load, temporary)
+
+    def __store(self, place: Place, value: int) -> Code:
+        if place[0] == _NAME_PLACE:
+            return [Op.MOV, place[1], value, 0]
+        if place[0] == _DEREF_PLACE:
+            return [Op.STORE, place[1], value, 0]
+        return [Op.STORE_INDEX, place[1], place[2], value]
+
+    def __patch_breaks(self, code: Code, target: int) -> Code:
+        """Resolve break placeholders in a while or switch body."""
+        for position in range(0, len(code), 4):
+            if code[position] == Op.BREAK:
+                code[position + 1] = target
+                code[position] = Op.JUMP
+        return code
+
+    """ Program Root. """
+
+    def program(self, args) -> IR_Program:
+        return {
+            "strings": self._strings,
+            "constants": self._constants,
+            "vectors": [d for kind, d in args if kind == "vector_definition"],
+            "functions": [d for kind, d in args if kind == "function_definition"],
+        }
+
+    """ Definitions. """
+
+    def definition(self, args):
+        """Passthrough"""
+        return args[0]
+
+    def v_size(self, args) -> Optional[_Fragment]:
+        """Passthrough"""
+        return args[0]
+
+    def v_symbol(self, args) -> int:
+        if isinstance(args[0], Token):
+            return self.__name(args[0].value)
+        return args[0].operand
+
+    def vector_definition(self, args) -> Tuple[str, IR_Vector]:
+        vector: IR_Vector = {
+            "name": self.__string(args[0].value),
+            "size": args[1].operand if args[1] is not None else Operand.NONE,
+            "values": args[2:],
+        }
+        return ("vector_definition", vector)
+
+    def parameters(self, args) -> List[_Fragment]:
+        return [fragment for fragment in args if fragment is not None]
+
+    def function_definition(self, args) -> Tuple[str, IR_Function]:
+        function: IR_Function = {
+            "name": self.__string(args[0].value),
+            "parameters": [
+                operand_value(fragment.place[1])
+                for fragment in (args[1] or [])
+                if fragment.place is not None
+            ],
+            "temporaries": self._temporaries,
+            "code": array("q", args[2]),
+        }
+        self._temporaries = 0
+        self._labels = 0
+        return ("function_definition", function)
+
+    """ Mutual-recursive Branches. """
+
+    def statement(self, args) -> Code:
+        return args[0]
+
+    def statement_2(self, args) -> Code:
+        return args[0]
+
+    def rvalue(self, args) -> _Fragment:
+        return args[0]
+
+    def expression(self, args) -> Code:
+        return args[0].code if args else []
+
+    """ Statements. """
+
+    def function_body(self, args) -> Code:
+        return [instruction for code in args for instruction in code]
+
+    def block_statement(self, args) -> Code:
+        return [instruction for code in args for instruction in code]
+
+    def rvalue_statement(self, args) -> Code:
+        return [instruction for code in args for instruction in code]
+
+    def case_statement(self, args) -> Tuple[int, Code]:
+        return (args[0].operand, [i for code in args[1:] for i in code])
+
+    def switch_statement(self, args) -> Code:
+        condition = self.__value(args[0])
+        end = self.__label()
+        code = list(condition.code)
+        body: Code = []
+        for constant, statements in args[1:]:
+            case = self.__label()
+            code += [Op.JUMP_EQ, case, condition.operand, constant]
+            body += [Op.LABEL, case, 0, 0] + statements
+        code += [Op.JUMP, end, 0, 0]
+        return code + self.__patch_breaks(body, end) + [Op.LABEL, end, 0, 0]
+
+    def return_statement(self, args) -> Code:
+        if args[0] is None:
+            return [Op.RETURN, 0, 0, 0]
+        value = self.__value(args[0])
+        return value.code + [Op.RETURN, 0, value.operand, 0]
+
+    def while_statement(self, args) -> Code:
+        condition = self.__value(args[0])
+        top, end = self.__label(), self.__label()
+        return (
+            [Op.LABEL, top, 0, 0]
+            + condition.code
+            + [Op.JUMP_FALSE, end, condition.operand, 0]
+            + self.__patch_breaks(args[1], end)
+            + [Op.JUMP, top, 0, 0, Op.LABEL, end, 0, 0]
+        )
+
+    def if_statement(self, args) -> Code:
+        condition = self.__value(args[0])
+        otherwise = self.__label()
+        code = condition.code + [Op.JUMP_FALSE, otherwise, condition.operand, 0]
+        if args[2] is None:
+            return code + args[1] + [Op.LABEL, otherwise, 0, 0]
+        end = self.__label()
+        return (
+            code
+            + args[1]
+            + [Op.JUMP, end, 0, 0, Op.LABEL, otherwise, 0, 0]
+            + args[2]
+            + [Op.LABEL, end, 0, 0]
+        )
+
+    def goto_statement(self, args) -> Code:
+        return [Op.JUMP, self.__label(args[0].value), 0, 0]
+
+    def label_statement(self, args) -> Code:
+        return [Op.LABEL, self.__label(args[0].value[:-1].strip()), 0, 0]
+
+    def extrn_statement(self, args) -> Code:
+        return [i for name in args for i in (Op.EXTRN, self.__name(name.value), 0, 0)]
+
+    def auto_statement(self, args) -> Code:
+        code: Code = []
+        for fragment in args:
+            if fragment.place[0] == _INDEX_PLACE:
+                code += [Op.AUTO, fragment.place[1], fragment.place[2], 0]
+            else:
+                code += [Op.AUTO, fragment.place[1], 0, 0]
+        return code
+
+    def break_statement(self, args) -> Code:
+        return [Op.BREAK, 0, 0, 0]
+
+    """ Expressions. """
+
+    def function_expression(self, args) -> _Fragment:
+        callee = self.__value(args[0])
+        parameters = [self.__value(fragment) for fragment in args[1]]
+        code = callee.code + [i for p in parameters for i in p.code]
+        for parameter in parameters:
+            code += [Op.PARAM, 0, parameter.operand, 0]
+        result = self.__temporary()
+        code += [Op.CALL, result, callee.operand, self.__immediate(len(parameters))]
+        return _Fragment(code, result)
+
+    def relation_expression(self, args) -> _Fragment:
+        left, right = self.__value(args[0]), self.__value(args[2])
+        result = self.__temporary()
+        operator = args[1].data
+        if operator in ("and_operator", "or_operator"):
+            # if (left && right) is false, or (left || right) is true, early
+            short = Op.JUMP_FALSE if operator == "and_operator" else Op.JUMP_TRUE
+            value = 0 if operator == "and_operator" else 1
+            early, end = self.__label(), self.__label()
+            return _Fragment(
+                left.code
+                + [short, early, left.operand, 0]
+                + right.code
+                + [short, early, right.operand, 0]
+                + [Op.MOV, result, self.__immediate(1 - value), 0]
+                + [Op.JUMP, end, 0, 0, Op.LABEL, early, 0, 0]
+                + [Op.MOV, result, self.__immediate(value), 0]
+                + [Op.LABEL, end, 0, 0],
+                result,
+            )
+        return _Fragment(
+            left.code
+            + right.code
+            + [self.operator_map[operator], result, left.operand, right.operand],
+            result,
+        )
+
+    def ternary_expression(self, args) -> _Fragment:
+        condition = self.__value(args[0])
+        left, right = self.__value(args[1]), self.__value(args[2])
+        result = self.__temporary()
+        otherwise, end = self.__label(), self.__label()
+        return _Fragment(
+            condition.code
+            + [Op.JUMP_FALSE, otherwise, condition.operand, 0]
+            + left.code
+            + [Op.MOV, result, left.operand, 0, Op.JUMP, end, 0, 0]
+            + [Op.LABEL, otherwise, 0, 0]
+            + right.code
+            + [Op.MOV, result, right.operand, 0, Op.LABEL, end, 0, 0],
+            result,
+        )
+
+    def lvalue_expression(self, args) -> _Fragment:
+        """Passthrough"""
+        return args[0]
+
+    def constant_expression(self, args) -> _Fragment:
+        """Passthrough"""
+        return args[0]
+
+    def unary_expression(self, args) -> _Fragment:
+        operand = self.__value(args[1])
+        result = self.__temporary()
+        operator = self.unary_operator_map[args[0].data.value]
+        return _Fragment(operand.code + [operator, result, operand.operand, 0], result)
+
+    def unary_operand(self, args) -> _Fragment:
+        return args[0]
+
+    def evaluated_expression(self, args) -> _Fragment:
+        return args[0]
+
+    def address_of_expression(self, args) -> _Fragment:
+        place = args[1].place
+        if place[0] == _DEREF_PLACE:
+            return _Fragment(args[1].code, place[1])
+        result = self.__temporary()
+        if place[0] == _NAME_PLACE:
+            return _Fragment(args[1].code + [Op.ADDR, result, place[1], 0], result)
+        return _Fragment(args[1].code + [Op.ADD, result, place[1], place[2]], result)
+
+    def __inc_dec(self, lvalue: _Fragment, operator: str, post: bool) -> _Fragment:
+        assert lvalue.place is not None
+        value = self.__value(lvalue)
+        opcode = Op.ADD if operator == "unary_inc" else Op.SUB
+        code = value.code
+        previous = value.operand
+        if post:
+            previous = self.__temporary()
+            code = code + [Op.MOV, previous, value.operand, 0]
+        result = self.__temporary()
+        code = code + [opcode, result, value.operand, self.__immediate(1)]
+        code = code + self.__store(lvalue.place, result)
+        return _Fragment(code, previous if post else result)
+
+    def post_inc_dec_expression(self, args) -> _Fragment:
+        return self.__inc_dec(args[0], args[1].data.value, post=True)
+
+    def pre_inc_dec_expression(self, args) -> _Fragment:
+        return self.__inc_dec(args[1], args[0].data.value, post=False)
+
+    def assignment_expression(self, args) -> _Fragment:
+        value = self.__value(args[2])
+        return _Fragment(
+            args[0].code + value.code + self.__store(args[0].place, value.operand),
+            value.operand,
+        )
+
+    def assignment_operator(self, args) -> None:
+        return None
+
+    """ Inline Lvalue grammar productions. """
+
+    def identifier(self, args) -> _Fragment:
+        name = self.__name(args[0].value)
+        return _Fragment([], name, (_NAME_PLACE, name))
+
+    def indirect_identifier(self, args) -> _Fragment:
+        pointer = self.__value(args[1])
+        return _Fragment(pointer.code, None, (_DEREF_PLACE, pointer.operand))
+
+    def vector_identifier(self, args) -> _Fragment:
+        base, index = self.__value(args[0]), self.__value(args[1])
+        return _Fragment(
+            base.code + index.code, None, (_INDEX_PLACE, base.operand, index.operand)
+        )
+
+    """ Constants. """
+
+    def integer_literal(self, args) -> _Fragment:
+        value = int("".join(args))
+        if value > _MAX_IMMEDIATE:
+            return _Fragment([], self.__constant(value))
+        return _Fragment([], self.__immediate(value))
+
+    def float_literal(self, args) -> _Fragment:
+        return _Fragment([], self.__constant(float("".join(args)[:-1])))
+
+    def bool_literal(self, args) -> _Fragment:
+        return _Fragment([], self.__immediate(1 if "".join(args) == "true" else 0))
+
+    def double_literal(self, args) -> _Fragment:
+        return _Fragment([], self.__constant(float(f"{args[0]}.{args[1]}")))
+
+    def string_literal(self, args) -> _Fragment:
+        return _Fragment([], self.__constant("".join(args)))
+
+    def constant_literal(self, args) -> _Fragment:
+        literal = "".join(args)
+        if not literal.startswith("'"):
+            literal = f"'{literal}'"
+        return _Fragment([], self.__constant(literal))
+
+    def SEMI_COLON(self, name):
+        """Throw away ';'"""
+        return Discard
+
+
+def format_operand(program: IR_Program, operand: int) -> str:
+    """Render an encoded operand for IR listings."""
+    kind, value = operand_kind(operand), operand_value(operand)
+    if kind == Operand.TEMP:
+        return f"t{value}"
+    if kind in (Operand.NAME, Operand.LABEL):
+        return program["strings"][value]
+    if kind == Operand.CONST:
+        return str(program["constants"][value])
+    if kind == Operand.INT:
+        return str(value)
+    return "_"
+
+
+def format_ir(program: IR_Program) -> str:
+    """Human readable listing of an IR program."""
+    lines = []
+    for vector in program["vectors"]:
+        values = ", ".join(format_operand(program, v) for v in vector["values"])
+        size = format_operand(program, vector["size"])
+        lines.append(f"{program['strings'][vector['name']]}[{size}] {values}")
+    for function in program["functions"]:
+        parameters = ", ".join(program["strings"][p] for p in function["parameters"])
+        lines.append(f"{program['strings'][function['name']]}({parameters}):")
+        code = function["code"]
+        for position in range(0, len(code), 4):
+            operands = " ".join(
+                format_operand(program, code[position + slot]) for slot in (1, 2, 3)
+            )
+            lines.append(f"    {Op(code[position]).name} {operands}")
+    return "\n".join(lines)
@@ -0,0 +1,124 @@
+from __future__ import annotations
+from typing import TypedDict, Literal, Optional, Union
+import sys
+import time
+
+
+class Resource_Limits(TypedDict, total=False):
+    """Budgets of one parse of an untrusted source program.
+
+    Every limit is optional, and an absent limit is not checked.
+    """
+
+    """ Maximum size of the source program in UTF-8 bytes. """
+    bytes: int
+
+    """ Maximum number of tokens. """
+    tokens: int
+
+    """ Maximum depth of the LALR(1) parse stack, i.e. nesting of rules. """
+    depth: int
+
+    """ Maximum number of AST nodes. """
+    nodes: int
+
+    """ Wall-clock budget in seconds. """
+    seconds: float
+
+
+Limit = Literal["bytes", "tokens", "depth", "nodes", "seconds"]
+
+
+class Resource_Limit_Error(Exception):
+    """A source program exceeded one of its resource limits.
+
+    Attributes:
+        limit: Name of the exceeded limit
+        value: Value that was reached when the check failed
+        maximum: The configured limit
+        line: Line of the source program, when known
+        column: Column of the source program, when known
+
+    """
+
+    __module__ = "B Language Parser"
+
+    def __init__(
+        self,
+        limit: Limit,
+        value: Union[int, float],
+        maximum: Union[int, float],
+        line: Optional[int] = None,
+        column: Optional[int] = None,
+    ) -> None:
+        self.limit = limit
+        self.value = value
+        self.maximum = maximum
+        self.line = line
+        self.column = column
+        position = f" at line {line}, column {column}" if line is not None else ""
+        super().__init__(f"{limit} limit of {maximum} exceeded ({value}){position}")
+
+
+""" Number of tokens or nodes between two checks of the clock. """
+CLOCK_INTERVAL = 256
+
+
+class _Budget:
+    """Running resource checks of one parse, or one transform.
+
+    The clock starts when the budget is created.
+    """
+
+    def __init__(self, limits: Resource_Limits) -> None:
+        self.limits = limits
+        self.tokens = limits.get("tokens")
+        self.depth = limits.get("depth")
+        self.nodes = limits.get("nodes")
+        self.seconds = limits.get("seconds")
+        self.started = time.monotonic()
+
+    def check_bytes(self, source_program: str) -> None:
+        maximum = self.limits.get("bytes")
+        # a character is at least one and at most four bytes in UTF-8
+        if maximum is None or len(source_program) * 4 <= maximum:
+            return
+        size = len(source_program.encode("utf-8", "surrogatepass"))
+        if size > maximum:
+            raise Resource_Limit_Error("bytes", size, maximum)
+
+    def check_token(
+        self, count: int, depth: int, line: Optional[int], column: Optional[int]
+    ) -> None:
+        if self.tokens is not None and count > self.tokens:
+            raise Resource_Limit_Error("tokens", count, self.tokens, line, column)
+        if self.depth is not None and depth > self.depth:
+            raise Resource_Limit_Error("depth", depth, self.depth, line, column)
+        self.check_clock(line, column)
+
+    def check_nodes(self, count: int) -> None:
+        if self.nodes is not None and count > self.nodes:
+            raise Resource_Limit_Error("nodes", count, self.nodes)
+        self.check_clock()
+
+    def depth_exceeded(self) -> Resource_Limit_Error:
+        """Depth error of a transform that exhausted the interpreter stack.
+
+        The parse stack of a deeply nested expression (e.g. parentheses) can
+        be within the depth limit, while the recursive transform of its
+        parse tree is not; its value is the recursion limit.
+        """
+        limit = sys.getrecursionlimit()
+        return Resource_Limit_Error(
+            "depth", limit, self.depth if self.depth is not None else limit
+        )
+
+    def check_clock(
+        self, line: Optional[int] = None, column: Optional[int] = None
+    ) -> None:
+        if self.seconds is not None:
+            elapsed = time.monotonic() - self.started
+            if elapsed > self.seconds:
+                raise Resource_Limit_Error(
+                    "seconds", round(elapsed, 3), self.seconds, line, column
+                )
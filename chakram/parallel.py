@@ -0,0 +1,236 @@
+from __future__ import annotations
+from concurrent.futures import Executor, ProcessPoolExecutor
+from lark import exceptions
+from chakram.parser import Parser, Syntax_Error
+from chakram.transformer import AST_Transformer, AST_Node, Symbol_Table, _Meta
+from typing import List, Optional, Tuple, Any
+import os
+
+
+""" Recorded symbol table operation: (method name, arguments). """
+Symbol_Operation = Tuple[str, Tuple[Any, ...]]
+
+""" A chunk of source: (start offset, end offset). """
+Chunk = Tuple[int, int]
+
+
+class _Recording_Transformer(AST_Transformer):
+    """AST transformer that records symbol table operations.
+
+    A chunk cannot know which names earlier chunks declared, so instead of
+    its local symbol table each worker returns the operations it performed,
+    which are replayed in source order into one table on merge.
+    """
+
+    def __init__(self, use_meta=False, intern=False):
+        self.operations: List[Symbol_Operation] = []
+        super().__init__(use_meta=use_meta, intern=intern)
+
+    def _define_symbol(self, name: str, entry: _Meta) -> None:
+        self.operations.append(("_define_symbol", (name, dict(entry))))
+        super()._define_symbol(name, entry)
+
+    def _declare_symbol(self, name: str, entry: _Meta) -> None:
+        self.operations.append(("_declare_symbol", (name, dict(entry))))
+        super()._declare_symbol(name, entry)
+
+    def _update_symbol(self, name: str, type: str, size: Optional[int] = None) -> None:
+        self.operations.append(("_update_symbol", (name, type, size)))
+        super()._update_symbol(name, type, size)
+
+
+def split_source_program(source_program: str) -> Optional[List[int]]:
+    """Prescan a source program for top-level definition boundaries.
+
+    Braces are matched while skipping strings, character constants and
+    comments. A definition ends at a ``;`` or a closing ``}`` at depth zero.
+
+    Args:
+        source_program: The source B program as a string
+
+    Returns:
+        End offsets of each top-level definition, or None when the braces
+        of the program are unbalanced (left for the parser to report)
+
+    """
+    boundaries: List[int] = []
+    depth = 0
+    position = 0
+    length = len(source_program)
+    while position < length:
+        character = source_program[position]
+        if character == "/" and source_program.startswith("//", position):
+            newline = source_program.find("\n", position)
+            position = length if newline == -1 else newline
+        elif character == "/" and source_program.startswith("/*", position):
+            end = source_program.find("*/", position + 2)
+            if end == -1:
+                return None
+            position = end + 1
+        elif character == '"' or character == "'":
+            position += 1
+            while position < length and source_program[position] != character:
+                if source_program[position] == "\\":
+                    position += 1
+                position += 1
+            if position >= length:
+                return None
+        elif character == "{":
+            depth += 1
+        elif character == "}":
+            depth -= 1
+            if depth < 0:
+                return None
+            if depth == 0:
+                boundaries.append(position + 1)
+        elif character == ";" and depth == 0:
+            boundaries.append(position + 1)
+        position += 1
+    return boundaries if depth == 0 else None
+
+
+def _chunk_source_program(source_program: str, chunks: int) -> List[Chunk]:
+    """Group definitions into at most ``chunks`` contiguous, even chunks."""
+    boundaries = split_source_program(source_program)
+    if not boundaries:
+        return [(0, len(source_program))]
+    boundaries[-1] = len(source_program)
+    target = len(source_program) / chunks
+    result: List[Chunk] = []
+    start = 0
+    for boundary in boundaries:
+        if boundary - start >= target or boundary == boundaries[-1]:
+            result.append((start, boundary))
+            start = boundary
+    return result
+
+
+def _rebase(entry: _Meta, positions: int, lines: int) -> None:
+    """Rebase chunk relative positions to offsets in the whole file."""
+    if entry.get("line") is not None:
+        entry["line"] += lines  # type: ignore
+    if entry.get("start_pos") is not None:
+        entry["start_pos"] += positions  # type: ignore
+    if entry.get("end_pos") is not None:
+        entry["end_pos"] += positions  # type: ignore
+
+
+def _rebase_ast(node: Any, positions: int, lines: int, seen: set) -> None:
+    if isinstance(node, list):
+        for item in node:
+            _rebase_ast(item, positions, lines, seen)
+    elif isinstance(node, dict):
+        if "_meta" in node and id(node["_meta"]) not in seen:
+            seen.add(id(node["_meta"]))
+            _rebase(node["_meta"], positions, lines)
+        # ternary expressions hold their condition node as the root
+        for key in ("root", "left", "right"):
+            _rebase_ast(node.get(key), positions, lines, seen)
+
+
+def _warm_parser() -> None:
+    """Process pool initializer: build the grammar tables once per worker."""
+    Parser("")
+
+
+def _chunk_text(source_program: str, chunks: List[Chunk]) -> List[Tuple[str, int, int]]:
+    """Chunk source text with the position and line offsets of each chunk.
+
+    A chunk is padded with the column of its first character so that
+    columns on its first line match the file, and lines and offsets are
+    then shifted by the position of the chunk.
+    """
+    result = []
+    lines = 0
+    previous = 0
+    for start, end in chunks:
+        lines += source_program.count("\n", previous, start)
+        previous = start
+        padding = start - (source_program.rfind("\n", 0, start) + 1)
+        text = " " * padding + source_program[start:end]
+        result.append((text, start - padding, lines))
+    return result
+
+
+def _parse_chunk(
+    text: str, positions: int, lines: int, meta: bool, intern: bool
+) -> Tuple[List[AST_Node], List[Symbol_Operation]]:
+    """Parse and transform one chunk of top-level definitions."""
+    tree = Parser(text).get_parse_tree()
+    transformer = _Recording_Transformer(use_meta=meta, intern=intern)
+    program = transformer.transform(tree)
+    if positions or lines:
+        _rebase_ast(program["left"], positions, lines, set())
+        for method, arguments in transformer.operations:
+            if method != "_update_symbol":
+                _rebase(arguments[1], positions, lines)
+    return program["left"], transformer.operations
+
+
+def _parse_chunk_in_worker(
+    text: str, positions: int, lines: int, meta: bool, intern: bool
+) -> Optional[Tuple[List[AST_Node], List[Symbol_Operation]]]:
+    """Parse a chunk in a worker, where parse errors report only failure."""
+    try:
+        return _parse_chunk(text, positions, lines, meta, intern)
+    except exceptions.LarkError:
+        return None
+
+
+def get_source_program_as_ast_in_parallel(
+    source_program: str,
+    meta=False,
+    intern=False,
+    workers: Optional[int] = None,
+    executor: Optional[Executor] = None,
+) -> Tuple[AST_Node, Symbol_Table]:
+    """Get AST and Symbol Table of a B program, parsed in parallel
+
+    The source is split at top-level definitions into one chunk per worker,
+    each chunk is parsed by a warm parser in a process pool, and the ASTs
+    and symbol tables are merged in source order. The result is identical
+    to the sequential ``AST_Transformer`` path, including ``_meta``.
+
+    Args:
+        source_program: The source B program as a string
+        meta: Enable semantic meta data flag
+        intern: Intern names and share identical leaf nodes flag
+        workers: Number of chunks and worker processes (os.cpu_count())
+        executor: Optional warm executor to reuse across calls
+
+    Returns:
+        Tuple of the AST and the Symbol Table
+
+    """
+    chunks = _chunk_source_program(source_program, workers or os.cpu_count() or 1)
+    results: List[Any] = [None]
+    if len(chunks) > 1:
+        texts = _chunk_text(source_program, chunks)
+        pool = executor or ProcessPoolExecutor(
+            max_workers=len(chunks), initializer=_warm_parser
+        )
+        try:
+            futures = [
+                pool.submit(_parse_chunk_in_worker, *text, meta, intern)
+                for text in texts
+            ]
+            results = [future.result() for future in futures]
+        finally:
+            if executor is None:
+                pool.shutdown()
+    if None in results:
+        # a failed chunk only knows chunk relative positions, so the whole
+        # program is parsed sequentially for the canonical result or error
+        try:
+            results = [_parse_chunk(source_program, 0, 0, meta, intern)]
+        except (exceptions.UnexpectedToken, exceptions.ParseError) as e:
+            raise Syntax_Error(f"{e}") from None
+
+    definitions: List[AST_Node] = []
+    symbols = AST_Transformer()
+    for chunk_definitions, operations in results:
+        definitions.extend(chunk_definitions)
+        for method, arguments in operations:
+            getattr(symbols, method)(*arguments)
+    ast: AST_Node = {"node": "program", "root": "definitions", "left": definitions}
+    return ast, symbols.get_symbol_table()
@@ -1,16 +1,46 @@
 from lark import Lark, Tree, exceptions
 from chakram.transformer import AST_Transformer, AST_Node, Symbol_Table
+from chakram.ir import IR_Transformer, IR_Program
+from chakram.query import AST_Index
+from chakram.semantic import Semantic_Transformer, Semantic_Diagnostic
+from chakram.limits import Resource_Limit_Error  # noqa: F401
+from chakram.limits import Resource_Limits, _Budget, CLOCK_INTERVAL
+from typing import Dict, Iterator, List, NamedTuple, Optional, Union, TextIO, Tuple
+from mmap import mmap
 import os
+import re
 import json
-import logging
 import sys
+import functools
+import threading
 
 
 class Syntax_Error(Exception):
     __module__ = "B Language Parser"
 
 
-logging.basicConfig(level=logging.DEBUG)
+_parsers: Dict[str, Lark] = {}
+
+_parsers_lock = threading.Lock()
+
+
+def _load_parser(grammar: str) -> Lark:
+    """Build the LALR(1) lark parser of a grammar once per process.
+
+    Grammar analysis and table construction cost an order of magnitude more
+    than a typical parse, and the tables are immutable once built, so one
+    parser is shared by every thread; each parse keeps its state on the
+    stack. Lark compiles the scanner of each lexer state on first use, an
+    idempotent assignment, so a race there at worst compiles one twice.
+    """
+    parser = _parsers.get(grammar)
+    if parser is None:
+        with _parsers_lock:
+            parser = _parsers.get(grammar)
+            if parser is None:
+                parser = Lark(grammar, start="program", parser="lalr", debug=True)
+                _parsers[grammar] = parser
+    return parser
 
 
 class Parser:
@@ -19,14 +49,30 @@ class Parser:
     Build and transform a parse tree for syntax-directed translation of
     a source program. Initializes with the provided LALR(1) lark grammar.
 
+    A Parser, like an ``AST_Transformer``, holds the state of one parse and
+    is not shared between threads. The grammar tables behind it are built
+    once per grammar and shared, so creating one per call is cheap and the
+    factory functions below are safe to call from any number of threads.
+
+    With resource limits the parser steps the lark parser token by token,
+    and raises ``Resource_Limit_Error`` as soon as a budget is exceeded.
+
+    In lean mode the parser keeps no reference to the source program once
+    it is parsed, and ``release_parse_tree`` hands the tree over, so that a
+    long-running caller holds nothing but its result. Lark lexes ``str``,
+    so a source program of bytes or an mmap is decoded for the parse only;
+    the grammar text and tables are shared by every parser.
+
     Args:
-        source_program: The source B program.
+        source_program: The source B program, as a string, bytes or mmap.
         transformer: Syntax-directed transformer.
         debug: Debug flag in Lark.
         grammar: Optional alternative LALR(1) grammar that passes to lark.
+        limits: Optional resource limits of untrusted input.
+        lean: Do not keep the source program.
 
     Attributes:
-        source_program: The source program.
+        source_program: The source program, None in lean mode.
         transformer: Syntax-directed transformer.
         parser: Lark LALR(1) parser instance.
         grammar: LALR(1) grammar that passes to lark.
@@ -36,14 +82,21 @@ class Parser:
 
     def __init__(
         self,
-        source_program: str,
+        source_program: Union[str, bytes, mmap],
         debug=True,
         grammar=f"{os.path.dirname(__file__)}/grammar.lark",
+        limits: Optional[Resource_Limits] = None,
+        lean=False,
     ) -> None:
-        self.source: str = source_program
+        if not isinstance(source_program, str):
+            source_program = str(source_program, "utf-8")
+        self.source: Optional[str] = None if lean else source_program
         self._read_grammar(grammar)
-        self.parser = Lark(self.grammar, start="program", parser="lalr", debug=True)
-        self._tree = self.parser.parse(self.source)
+        self.parser = _load_parser(self.grammar)
+        if limits:
+            self._tree = self._parse_with_limits(source_program, _Budget(limits))
+        else:
+            self._tree = self.parser.parse(source_program)
 
     def __str__(self) -> str:
         """The parse tree as formatted string"""
@@ -58,6 +111,18 @@ class Parser:
         """
         return self._tree
 
+    def release_parse_tree(self) -> Tree:
+        """Hand the parse tree over, the parser no longer references it.
+
+        Returns:
+            The parse tree.
+
+        """
+        tree, self._tree = self._tree, None  # type: ignore
+        if tree is None:
+            raise ValueError("the parse tree was already released")
+        return tree
+
     def print_parse_tree(self, pretty=False, file=None) -> None:
         """Print parse tree.
 
@@ -72,159 +137,503 @@ class Parser:
         else:
             print(self.get_parse_tree(), file=file)
 
+    def _parse_with_limits(self, source_program: str, budget: _Budget) -> Tree:
+        """Parse token by token, checking the budget after each token."""
+        budget.check_bytes(source_program)
+        interactive = self.parser.parse_interactive(source_program)
+        state = interactive.parser_state
+        stack = state.state_stack
+        tokens = budget.tokens if budget.tokens is not None else sys.maxsize
+        depth = budget.depth if budget.depth is not None else sys.maxsize
+        count = 0
+        token = None
+        for token in interactive.lexer_thread.lex(state):
+            count += 1
+            state.feed_token(token)
+            if count > tokens or len(stack) > depth or count % CLOCK_INTERVAL == 0:
+                budget.check_token(count, len(stack), token.line, token.column)
+        return interactive.feed_eof(token)
+
     def _read_grammar(self, location: str) -> None:
         """Read source grammar.
 
-        Read a grammar from location on disk.
+        Read a grammar from location on disk, once per process.
 
         Args:
             grammar: The source LALR(1) grammar.
 
         """
-        with open(location) as file:
-            self.grammar = file.read()
+        self.grammar = _read_grammar(location)
 
 
-def parse_source_program(source_program: str, debug=True) -> Tree:
-    sys.tracebacklimit = 0
+def parse_source_program(
+    source_program: str, debug=True, limits: Optional[Resource_Limits] = None
+) -> Tree:
     try:
         """Get parse tree of B program as serializable tree (Lark.Tree)
 
         Args:
             source_program: The source B program as a string
             debug: debug flag
+            limits: Optional resource limits of untrusted input
 
         Returns:
             Serializable parse tree
 
         """
-        return Parser(source_program, debug=debug).get_parse_tree()
+        return Parser(source_program, debug=debug, limits=limits).get_parse_tree()
     except (exceptions.UnexpectedToken, exceptions.ParseError) as e:
         raise Syntax_Error(f"{e}") from None
 
 
 def parse_source_program_as_string(
-    source_program: str, pretty: bool = True, debug=True
+    source_program: str,
+    pretty: bool = True,
+    debug=True,
+    limits: Optional[Resource_Limits] = None,
 ) -> str:
-    sys.tracebacklimit = 0
     try:
         """Get parse tree of B program as serializable tree (Lark.Tree)
 
         Args:
             source_program: The source B program as a string
             debug: debug flag
+            limits: Optional resource limits of untrusted input
 
         Returns:
             Parse tree as string
 
         """
         if pretty:
-            return parse_source_program(source_program, debug).pretty()
+            return parse_source_program(source_program, debug, limits).pretty()
         else:
-            return str(parse_source_program(source_program, debug))
+            return str(parse_source_program(source_program, debug, limits))
     except (exceptions.UnexpectedToken, exceptions.ParseError) as e:
         raise Syntax_Error(f"{e}") from None
 
 
-def get_source_program_as_ast(source_program: str, meta=False, debug=True) -> AST_Node:
-    sys.tracebacklimit = 0
+def get_source_program_as_ast(
+    source_program: Union[str, bytes, mmap],
+    meta=False,
+    debug=True,
+    intern=False,
+    limits: Optional[Resource_Limits] = None,
+    flatten=False,
+    lean=False,
+) -> AST_Node:
     try:
         """Get AST of B program (Lark.Tree)
 
         Args:
-            source_program: The source B program as a string
+            source_program: The source B program as a string, bytes or mmap
             meta: Enable semantic meta data flag
             debug: debug flag
+            intern: Intern names and share identical leaf nodes flag
+            limits: Optional resource limits of untrusted input
+            flatten: Flatten runs of an associative operator to n-ary nodes flag
+            lean: Free the source program and parse tree as they are consumed flag
 
         Returns:
             Tree[AST]
 
         """
-        tree = Parser(source_program, debug=debug).get_parse_tree()
-        ast: AST_Node = AST_Transformer(use_meta=meta).transform(tree)
+        transformer = AST_Transformer(
+            use_meta=meta, intern=intern, limits=limits, flatten=flatten, consume=lean
+        )
+        tree = Parser(
+            source_program, debug=debug, limits=limits, lean=lean
+        ).get_parse_tree()
+        ast: AST_Node = transformer.transform(tree)
         return ast
     except (exceptions.UnexpectedToken, exceptions.ParseError) as e:
         raise Syntax_Error(f"{e}") from None
 
 
-def get_source_program_symbol_table(source_program: str, debug=True) -> Symbol_Table:
-    sys.tracebacklimit = 0
+def get_source_program_symbol_table(
+    source_program: Union[str, bytes, mmap],
+    debug=True,
+    limits: Optional[Resource_Limits] = None,
+    lean=False,
+) -> Symbol_Table:
     try:
         """Get Symbol Table of Source Program
 
         Args:
-            source_program: The source B program as a string
+            source_program: The source B program as a string, bytes or mmap
             debug: debug flag
+            limits: Optional resource limits of untrusted input
+            lean: Free the source program and parse tree as they are consumed flag
 
         Returns:
             Symbol Table
 
         """
-        tree = Parser(source_program, debug=debug).get_parse_tree()
-        ast = AST_Transformer(use_meta=True)
-        ast.transform(tree)
+        ast = AST_Transformer(use_meta=True, limits=limits, consume=lean)
+        ast.transform(
+            Parser(source_program, debug=debug, limits=limits, lean=lean).get_parse_tree()
+        )
         return ast.get_symbol_table()
     except (exceptions.UnexpectedToken, exceptions.ParseError) as e:
         raise Syntax_Error(f"{e}") from None
 
 
+def get_source_program_diagnostics(
+    source_program: str, debug=True, limits: Optional[Resource_Limits] = None
+) -> List[Semantic_Diagnostic]:
+    try:
+        """Get semantic errors and warnings of B program, checked in one pass
+
+        Args:
+            source_program: The source B program as a string
+            debug: debug flag
+            limits: Optional resource limits of untrusted input
+
+        Returns:
+            List of diagnostics, by position
+
+        """
+        checker = Semantic_Transformer(limits=limits)
+        checker.transform(
+            Parser(source_program, debug=debug, limits=limits).get_parse_tree()
+        )
+        return checker.get_diagnostics()
+    except (exceptions.UnexpectedToken, exceptions.ParseError) as e:
+        raise Syntax_Error(f"{e}") from None
+
+
+def get_source_program_ast_index(
+    source_program: str,
+    meta=False,
+    debug=True,
+    limits: Optional[Resource_Limits] = None,
+) -> AST_Index:
+    try:
+        """Get the node index of the AST of B program, for selector queries
+
+        Args:
+            source_program: The source B program as a string
+            meta: Enable semantic meta data flag
+            debug: debug flag
+            limits: Optional resource limits of untrusted input
+
+        Returns:
+            AST_Index of nodes by kind with parent links, its root is the AST
+
+        """
+        transformer = AST_Transformer(use_meta=meta, limits=limits, index=True)
+        transformer.transform(
+            Parser(source_program, debug=debug, limits=limits).get_parse_tree()
+        )
+        return transformer.get_index()  # type: ignore
+    except (exceptions.UnexpectedToken, exceptions.ParseError) as e:
+        raise Syntax_Error(f"{e}") from None
+
+
 def get_source_program_ast_as_string(
-    source_program: str, meta=False, debug=True
+    source_program: Union[str, bytes, mmap],
+    meta=False,
+    debug=True,
+    intern=False,
+    limits: Optional[Resource_Limits] = None,
+    flatten=False,
+    lean=False,
 ) -> str:
-    sys.tracebacklimit = 0
     try:
         """Get AST of B program as string
 
         Args:
-            source_program: The source B program as a string
+            source_program: The source B program as a string, bytes or mmap
             meta: Enable semantic meta data flag
             debug: debug flag
+            intern: Intern names and share identical leaf nodes flag
+            limits: Optional resource limits of untrusted input
+            flatten: Flatten runs of an associative operator to n-ary nodes flag
+            lean: Free the source program and parse tree as they are consumed flag
 
         Returns:
             AST as string
 
         """
-        tree = Parser(source_program, debug=debug).get_parse_tree()
-        ast = AST_Transformer(use_meta=meta).transform(tree)
+        transformer = AST_Transformer(
+            use_meta=meta, intern=intern, limits=limits, flatten=flatten, consume=lean
+        )
+        tree = Parser(
+            source_program, debug=debug, limits=limits, lean=lean
+        ).get_parse_tree()
+        ast = transformer.transform(tree)
         return str(ast)
     except (exceptions.UnexpectedToken, exceptions.ParseError) as e:
         raise Syntax_Error(f"{e}") from None
 
 
-def get_source_program_ast_as_json(source_program: str, meta=False, debug=True):
-    sys.tracebacklimit = 0
+def get_source_program_ast_as_json(
+    source_program: Union[str, bytes, mmap],
+    meta=False,
+    debug=True,
+    intern=False,
+    limits: Optional[Resource_Limits] = None,
+    flatten=False,
+    lean=False,
+):
     try:
         """Get AST of B program as JSON
 
         Args:
-            source_program: The source B program as a string
+            source_program: The source B program as a string, bytes or mmap
             meta: Enable semantic meta data flag
             debug: Debug flag
+            intern: Intern names and share identical leaf nodes flag
+            limits: Optional resource limits of untrusted input
+            flatten: Flatten runs of an associative operator to n-ary nodes flag
+            lean: Free the source program and parse tree as they are consumed flag
 
         Returns:
             AST as json dump
 
         """
-        tree = Parser(source_program, debug=debug).get_parse_tree()
-        ast = AST_Transformer(use_meta=meta).transform(tree)
+        transformer = AST_Transformer(
+            use_meta=meta, intern=intern, limits=limits, flatten=flatten, consume=lean
+        )
+        tree = Parser(
+            source_program, debug=debug, limits=limits, lean=lean
+        ).get_parse_tree()
+        ast = transformer.transform(tree)
         return json.dumps(ast)
     except (exceptions.UnexpectedToken, exceptions.ParseError) as e:
         raise Syntax_Error(f"{e}") from None
 
 
-def get_source_program_symbol_table_as_json(source_program: str, debug=True):
-    sys.tracebacklimit = 0
+def get_source_program_symbol_table_as_json(
+    source_program: str, debug=True, limits: Optional[Resource_Limits] = None
+):
     try:
         """Get Symbol Table of Source Program as JSON
 
         Args:
             source_program: The source B program as a string
             debug: debug flag
+            limits: Optional resource limits of untrusted input
 
         Returns:
             Symbol Table
 
         """
-        return json.dumps(get_source_program_symbol_table(source_program, debug=debug))
+        return json.dumps(get_source_program_symbol_table(source_program, debug, limits))
+    except (exceptions.UnexpectedToken, exceptions.ParseError) as e:
+        raise Syntax_Error(f"{e}") from None
+
+
+def get_source_program_as_ir(
+    source_program: str, debug=True, limits: Optional[Resource_Limits] = None
+) -> IR_Program:
+    try:
+        """Get flat three-address code IR of B program
+
+        Args:
+            source_program: The source B program as a string
+            debug: debug flag
+            limits: Optional resource limits, except for AST nodes
+
+        Returns:
+            IR program with array-backed instructions per function
+
+        """
+        transformer = IR_Transformer(limits=limits)
+        tree = Parser(source_program, debug=debug, limits=limits).get_parse_tree()
+        return transformer.transform(tree)
+    except (exceptions.UnexpectedToken, exceptions.ParseError) as e:
+        raise Syntax_Error(f"{e}") from None
+
+
+def get_source_program_ir_as_json(
+    source_program: str, debug=True, limits: Optional[Resource_Limits] = None
+):
+    try:
+        """Get flat three-address code IR of B program as JSON
+
+        Args:
+            source_program: The source B program as a string
+            debug: debug flag
+            limits: Optional resource limits of untrusted input
+
+        Returns:
+            IR as json dump
+
+        """
+        ir = get_source_program_as_ir(source_program, debug, limits)
+        for function in ir["functions"]:
+            function["code"] = function["code"].tolist()  # type: ignore
+        return json.dumps(ir)
     except (exceptions.UnexpectedToken, exceptions.ParseError) as e:
         raise Syntax_Error(f"{e}") from None
+
+
+class Source_Token(NamedTuple):
+    """A lexical token of a source program"""
+
+    kind: str
+    value: str
+    start_pos: int
+    line: int
+    column: int
+
+
+""" Token kinds of the anonymous terminals of the grammar, by pattern. """
+_ANONYMOUS_TERMINALS = {
+    "++": "INC",
+    "--": "DEC",
+    "||": "OR",
+    "&&": "AND",
+    "==": "EQ",
+    "!=": "NE",
+    "<=": "LE",
+    ">=": "GE",
+    "<<": "LSHIFT",
+    ">>": "RSHIFT",
+    r"[a-zA-Z_][a-zA-Z0-9._]{0,7}[\s]*:": "LABEL",
+    r"\'\s\'": "CHAR_CONSTANT",
+}
+
+""" Tokens after which ``NAME :`` is a label statement, not a ternary ':'. """
+_LABEL_PRECEDES = {
+    None,
+    "SEMI_COLON",
+    "LBRACE",
+    "RBRACE",
+    "RPAR",
+    "COLON",
+    "LABEL",
+    "ELSE",
+}
+
+
+@functools.lru_cache(maxsize=None)
+def _read_grammar(location: str) -> str:
+    with open(location) as file:
+        return file.read()
+
+
+@functools.lru_cache(maxsize=None)
+def _load_scanner(grammar: str) -> Tuple[re.Pattern, Dict[str, Dict[str, str]]]:
+    """Compile the terminals of a grammar into one scanner pattern.
+
+    Terminals are ordered, and string terminals that a regular expression
+    terminal also matches (i.e. keywords and NAME) are folded into it, the
+    way the basic lexer of lark does, so that both agree token for token
+    without the per-token overhead of lark tokens.
+
+    Returns:
+        The scanner pattern and, per terminal, the keywords it may match
+
+    """
+    terminals = sorted(
+        _load_parser(grammar).terminals,
+        key=lambda t: (-t.priority, -t.pattern.max_width, -len(t.pattern.value), t.name),
+    )
+    kinds = {t.name: _ANONYMOUS_TERMINALS.get(t.pattern.value, t.name) for t in terminals}
+    keywords: Dict[str, Dict[str, str]] = {}
+    embedded = set()
+    for terminal in terminals:
+        if terminal.pattern.type != "re":
+            continue
+        pattern = re.compile(terminal.pattern.to_regexp())
+        for string in terminals:
+            if string.pattern.type != "str" or string.priority != terminal.priority:
+                continue
+            match = pattern.match(string.pattern.value)
+            if match is not None and match.group(0) == string.pattern.value:
+                names = keywords.setdefault(kinds[terminal.name], {})
+                names.setdefault(string.pattern.value, kinds[string.name])
+                if frozenset(string.pattern.flags) <= frozenset(terminal.pattern.flags):
+                    embedded.add(string.name)
+    scanner = "|".join(
+        f"(?P<{kinds[t.name]}>{t.pattern.to_regexp()})"
+        for t in terminals
+        if t.name not in embedded
+    )
+    return re.compile(f"{scanner}|(?P<UNEXPECTED>(?s:.))"), keywords
+
+
+def tokenize_source_program(
+    source_program: Union[str, bytes, mmap, TextIO],
+    comments=False,
+    grammar=f"{os.path.dirname(__file__)}/grammar.lark",
+) -> Iterator[Source_Token]:
+    """Lazily lex a B program into tokens, without parsing it
+
+    Tokens are matched with the terminals of the grammar. Outside of the
+    parser there is no parser state to pick a contextual terminal, so
+    character constants and labels, the two context dependent lexemes, are
+    resolved by their surrounding tokens: ``NAME :`` is a label unless a
+    ternary ``?`` is still unmatched, or it does not start a statement.
+
+    Args:
+        source_program: The source B program as a string, bytes, mmap or file
+        comments: Keep C and C++ style comment tokens
+        grammar: Optional alternative LALR(1) grammar location
+
+    Returns:
+        Iterator of tokens
+
+    """
+    if hasattr(source_program, "read"):
+        source_program = source_program.read()  # type: ignore
+    if not isinstance(source_program, str):
+        source_program = str(source_program, "utf-8")  # type: ignore
+    text: str = source_program  # type: ignore
+    scanner, keywords = _load_scanner(_read_grammar(grammar))
+    previous: Optional[str] = None
+    # ternary '?' still waiting for their ':'
+    ternaries = 0
+    skip = line_start = -1
+    line = 1
+    for match in scanner.finditer(text):
+        kind, value, start = match.lastgroup, match.group(), match.start()
+        column = start - line_start
+        token_line = line
+        if "\n" in value:
+            line += value.count("\n")
+            line_start = start + value.rfind("\n")
+        if start < skip or kind == "WS":
+            continue
+        if kind in keywords:
+            kind = keywords[kind].get(value, kind)  # type: ignore
+        if kind == "C_COMMENT" or kind == "CPP_COMMENT":
+            if comments:
+                yield Source_Token(kind, value, start, token_line, column)
+            continue
+        if kind == "QUOTE":
+            end = text.find("'", start + 1)
+            if end != -1 and end - start <= 3:
+                skip = end + 1
+                yield Source_Token(
+                    "CHAR_CONSTANT", text[start:skip], start, token_line, column
+                )
+                previous = "CHAR_CONSTANT"
+                continue
+        if kind == "LABEL" and (ternaries or previous not in _LABEL_PRECEDES):
+            ternaries = max(ternaries - 1, 0)
+            yield Source_Token("NAME", value[:-1].rstrip(), start, token_line, column)
+            colon = len(value) - 1
+            newline = value.rfind("\n")
+            yield Source_Token(
+                "COLON",
+                ":",
+                start + colon,
+                line,
+                column + colon if newline == -1 else colon - newline,
+            )
+            previous = "COLON"
+            continue
+        if kind == "UNEXPECTED":
+            raise Syntax_Error(
+                f"No terminal matches '{value}' at line {token_line} col {column}"
+            )
+        if kind == "QMARK":
+            ternaries += 1
+        elif kind == "COLON" and ternaries:
+            ternaries -= 1
+        elif kind == "SEMI_COLON":
+            ternaries = 0
+        yield Source_Token(kind, value, start, token_line, column)  # type: ignore
+        previous = kind
@@ -0,0 +1,207 @@
+from __future__ import annotations
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterator, List, Optional, Set
+from typing import Tuple
+import re
+
+if TYPE_CHECKING:
+    from chakram.transformer import AST_Node
+
+
+""" Compound selector: (kind or "*", optional root value). """
+_Compound = Tuple[str, Optional[str]]
+
+""" Selector step: (combinator to the next compound, compound). """
+_Step = Tuple[str, _Compound]
+
+_COMPOUND = re.compile(r"\s*(\*|[A-Za-z_][A-Za-z0-9_]*)(?:\[([^\]]*)\])?\s*")
+
+
+def parse_selector(selector: str) -> List[_Step]:
+    """Parse a selector into steps, from the outermost compound.
+
+    A selector is a sequence of compounds ``kind`` or ``kind[root]``, where
+    kind ``*`` is any node kind, joined by a space (descendant) or ``>``
+    (child), i.e. ``function_definition[main] function_expression[printf]``.
+
+    Args:
+        selector: The selector string
+
+    Returns:
+        List of (combinator, compound), the first combinator is empty
+
+    """
+    steps: List[_Step] = []
+    position = 0
+    combinator = ""
+    while position < len(selector):
+        match = _COMPOUND.match(selector, position)
+        if match is None:
+            raise ValueError(f"invalid selector {selector!r} at {position}")
+        steps.append((combinator, (match.group(1), match.group(2))))
+        position = match.end()
+        combinator = " "
+        if selector.startswith(">", position):
+            combinator = ">"
+            position += 1
+    if not steps or combinator == ">":
+        raise ValueError(f"invalid selector {selector!r}")
+    return steps
+
+
+def _root_value(node: AST_Node) -> Optional[str]:
+    """Root of a node as a string, or the operator of an operator node."""
+    root = node["root"]
+    if isinstance(root, list):
+        return str(root[0]) if root else None
+    if isinstance(root, dict):
+        return None
+    return str(root)
+
+
+class AST_Index:
+    """Index of AST nodes by kind, with parent links.
+
+    Built from an AST in one pass with ``from_ast``, which the indexing mode
+    of ``AST_Transformer`` does once the AST is constructed. Queries are
+    answered from the index without walking the tree, and repeated
+    selectors are cached.
+
+    In interning mode a shared leaf is indexed once, and every node that
+    references it is one of its ``parents``.
+
+    Attributes:
+        root: The indexed AST.
+
+    """
+
+    def __init__(self) -> None:
+        self.root: Optional[AST_Node] = None
+        self._kinds: Dict[str, List[AST_Node]] = {}
+        self._parents: Dict[int, AST_Node] = {}
+        self._shared: Dict[int, List[AST_Node]] = {}
+        self._selected: Dict[str, List[AST_Node]] = {}
+
+    @classmethod
+    def from_ast(cls, ast: AST_Node) -> AST_Index:
+        """Index an AST, children before their parents as they are built."""
+        index = cls()
+        parents, shared = index._parents, index._shared
+        # preorder visiting the last child first, which reversed is postorder
+        visited: List[AST_Node] = []
+        stack = [ast]
+        children: List[Any]
+        while stack:
+            node = stack.pop()
+            visited.append(node)
+            # ternary expressions hold their condition node as the root
+            for value in (node["root"], node.get("left"), node.get("right")):
+                if isinstance(value, dict):
+                    children = [value]
+                elif isinstance(value, list) and value:
+                    children = index.__children(value)
+                else:
+                    continue
+                for child in children:
+                    if id(child) not in parents:
+                        parents[id(child)] = node
+                    elif id(child) in shared:
+                        if shared[id(child)][-1] is not node:
+                            shared[id(child)].append(node)
+                    elif parents[id(child)] is not node:
+                        shared[id(child)] = [parents[id(child)], node]
+                stack.extend(children)
+        kinds = index._kinds
+        seen: Set[int] = set()
+        for node in reversed(visited):
+            # a shared leaf is visited once per parent, and indexed once
+            if id(node) not in seen:
+                seen.add(id(node))
+                kinds.setdefault(str(node["node"]), []).append(node)
+        index.root = ast
+        return index
+
+    def kinds(self) -> List[str]:
+        """Indexed node kinds."""
+        return list(self._kinds)
+
+    def nodes(self, kind: str = "*") -> List[AST_Node]:
+        """Nodes of a kind, or all nodes, in the order they were indexed."""
+        if kind == "*":
+            return [node for nodes in self._kinds.values() for node in nodes]
+        return self._kinds.get(kind, [])
+
+    def parent(self, node: AST_Node) -> Optional[AST_Node]:
+        """The parent node, one of those of a shared leaf, or None for the root."""
+        return self._parents.get(id(node))
+
+    def parents(self, node: AST_Node) -> List[AST_Node]:
+        """Every node that references node, more than one for a shared leaf."""
+        if id(node) in self._shared:
+            return list(self._shared[id(node)])
+        parent = self._parents.get(id(node))
+        return [] if parent is None else [parent]
+
+    def ancestors(self, node: AST_Node) -> Iterator[AST_Node]:
+        """Ancestors of a node from its parent to the root."""
+        parent = self.parent(node)
+        while parent is not None:
+            yield parent
+            parent = self.parent(parent)
+
+    def select(
+        self, selector: str, where: Optional[Callable[[AST_Node], Any]] = None
+    ) -> List[AST_Node]:
+        """Nodes matching a selector, and an optional predicate.
+
+        Args:
+            selector: i.e. ``statement[while] function_expression[f]``
+            where: Optional predicate of the selected nodes
+
+        Returns:
+            Matching nodes of the last compound of the selector
+
+        """
+        if selector not in self._selected:
+            steps = parse_selector(selector)
+            kind, root = steps[-1][1]
+            self._selected[selector] = [
+                node
+                for node in self.nodes(kind)
+                if (root is None or _root_value(node) == root)
+                and self.__match_ancestors(node, steps, len(steps) - 1)
+            ]
+        if where is None:
+            return list(self._selected[selector])
+        return [node for node in self._selected[selector] if where(node)]
+
+    def __match_ancestors(self, node: AST_Node, steps: List[_Step], step: int) -> bool:
+        """Match the steps before ``step`` against the ancestors of node."""
+        if step == 0:
+            return True
+        combinator = steps[step][0]
+        kind, root = steps[step - 1][1]
+        # only shared leaves have more than one parent, so the paths are few
+        pending = self.parents(node)
+        while pending:
+            ancestor = pending.pop()
+            if (kind == "*" or str(ancestor["node"]) == kind) and (
+                root is None or _root_value(ancestor) == root
+            ):
+                if self.__match_ancestors(ancestor, steps, step - 1):
+                    return True
+            if combinator != ">":
+                pending.extend(self.parents(ancestor))
+        return False
+
+    @staticmethod
+    def __children(values: List) -> List[Any]:
+        """Child nodes of a list, through its nested lists."""
+        children: List[Any] = []
+        pending = list(reversed(values))
+        while pending:
+            value = pending.pop()
+            if isinstance(value, dict):
+                children.append(value)
+            elif isinstance(value, list):
+                pending.extend(reversed(value))
+        return children
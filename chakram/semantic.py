@@ -0,0 +1,238 @@
+from __future__ import annotations
+from lark import Tree, Token
+from chakram.transformer import AST_Transformer, AST_Node
+from typing import TypedDict, Dict, List, Literal, Optional, Set, Tuple, Union
+
+Diagnostic_Code = Literal[
+    "undefined_identifier",
+    "undefined_label",
+    "undefined_extrn",
+    "duplicate_definition",
+    "break_outside_loop",
+    "void_value",
+]
+
+
+class Semantic_Diagnostic(TypedDict):
+    """A semantic error, or warning, found during transformation"""
+
+    code: Diagnostic_Code
+    severity: Literal["error", "warning"]
+    message: str
+    name: Optional[str]
+    line: Union[int, None]
+    column: Union[int, None]
+
+
+class Semantic_Transformer(AST_Transformer):
+    """AST transformer that checks basic semantics in the same pass.
+
+    Names, labels, extrns, calls and breaks are recorded as their nodes are
+    constructed, per function checks run when the function definition is
+    constructed and unit checks when the program is, so the checks need no
+    traversal of their own:
+
+    - ``undefined_identifier``: a name that is not a parameter, auto,
+      label or extrn of its function, nor defined at the top level
+    - ``undefined_label``: a goto to a label its function does not define
+    - ``undefined_extrn``: an extrn of a name the unit does not define, a
+      warning, as the name may be defined by another unit
+    - ``duplicate_definition``: a second top-level definition of a name
+    - ``break_outside_loop``: a break outside of while and switch
+    - ``void_value``: the value of a call to a function of the unit none
+      of whose returns has a value, or a warning when one has but its body
+      does not end with a return
+
+    As in B, a name called as a function is implicitly external, and names
+    defined at the top level of the unit are visible without an extrn.
+
+    Args:
+        use_meta: Enable semantic meta data flag
+        **kwargs: Options of ``AST_Transformer``
+
+    """
+
+    def __init__(self, use_meta=False, **kwargs) -> None:
+        super().__init__(use_meta=use_meta, **kwargs)
+        self._diagnostics: List[Semantic_Diagnostic] = []
+        self._definitions: Set[str] = set()
+        self._loops = 0
+        self._callees: Set[int] = set()
+        self._discarded: Set[int] = set()
+        self._calls: List[Tuple[Token, bool]] = []
+        self._extrns: List[Token] = []
+        self._unresolved: List[Token] = []
+        self._uses: List[Token] = []
+        self._locals: Set[str] = set()
+        self._labels: Set[str] = set()
+        self._gotos: List[Token] = []
+        # whether each return of the function being transformed has a value
+        self._returns: List[bool] = []
+        # void functions, None for a value returned on some paths only
+        self._void: Dict[str, Optional[bool]] = {}
+        # wrap the tree hook in use, which is the flattening one with flatten
+        self.__transform_inner = self._transform_tree
+        self._transform_tree = self.__transform_checked_tree  # type: ignore
+
+    def get_diagnostics(self) -> List[Semantic_Diagnostic]:
+        """Diagnostics of the last transformed program, by position."""
+        return self._diagnostics
+
+    def __report(
+        self,
+        code: Diagnostic_Code,
+        message: str,
+        token: Optional[Token],
+        name: Optional[str] = None,
+        severity: Literal["error", "warning"] = "error",
+    ) -> None:
+        self._diagnostics.append(
+            {
+                "code": code,
+                "severity": severity,
+                "message": message,
+                "name": name,
+                "line": getattr(token, "line", None),
+                "column": getattr(token, "column", None),
+            }
+        )
+
+    @staticmethod
+    def __callee(tree: Tree) -> Optional[Token]:
+        """Name token of a call of a plain name, i.e. ``f(x)``."""
+        callee = tree.children[0]
+        if isinstance(callee, Tree) and callee.data == "identifier":
+            return callee.children[0]  # type: ignore
+        return None
+
+    def __transform_checked_tree(self, tree: Tree):
+        """Lark tree transform with the context of the checks."""
+        if tree.data == "while_statement" or tree.data == "switch_statement":
+            self._loops += 1
+            try:
+                return self.__transform_inner(tree)
+            finally:
+                self._loops -= 1
+        if tree.data == "break_statement" and self._loops == 0:
+            tokens = (item for item in tree.children if isinstance(item, Token))
+            token = next(tokens, None)
+            self.__report("break_outside_loop", "break outside of while or switch", token)
+        elif tree.data == "expression" and isinstance(tree.children[0], Tree):
+            # a call as a statement discards its value
+            inner = tree.children[0].children[0]
+            if isinstance(inner, Tree) and inner.data == "function_expression":
+                callee = self.__callee(inner)
+                if callee is not None:
+                    self._discarded.add(id(callee))
+        elif tree.data == "function_expression":
+            callee = self.__callee(tree)
+            if callee is not None:
+                self._callees.add(id(callee))
+                self._calls.append((callee, id(callee) in self._discarded))
+        return self.__transform_inner(tree)
+
+    def identifier(self, args) -> AST_Node:
+        if id(args[0]) not in self._callees:
+            self._uses.append(args[0])
+        return super().identifier(args)
+
+    def auto_statement(self, args) -> AST_Node:
+        self.__declare(args)
+        return super().auto_statement(args)
+
+    def __declare(self, lvalues) -> None:
+        """Add the names of auto or parameter lvalues to the scope."""
+        for lvalue in lvalues:
+            # i.e. ``auto *p``
+            while isinstance(lvalue, dict) and lvalue["node"] == "indirect_lvalue":
+                lvalue = lvalue["left"]
+            if isinstance(lvalue, dict) and isinstance(lvalue["root"], str):
+                self._locals.add(str(lvalue["root"]))
+
+    def extrn_statement(self, args) -> AST_Node:
+        for name in args:
+            self._locals.add(str(name))
+            self._extrns.append(name)
+        return super().extrn_statement(args)
+
+    def label_statement(self, args) -> AST_Node:
+        self._labels.add(str(args[0])[:-1].rstrip())
+        return super().label_statement(args)
+
+    def return_statement(self, args) -> AST_Node:
+        self._returns.append(any(arg is not None for arg in args))
+        return super().return_statement(args)
+
+    def goto_statement(self, args) -> AST_Node:
+        self._gotos.append(args[0])
+        return super().goto_statement(args)
+
+    def function_definition(self, args) -> AST_Node:
+        self.__define(args[0])
+        self.__declare(args[1].children)
+        for goto in self._gotos:
+            if str(goto) not in self._labels:
+                self.__report(
+                    "undefined_label", f"undefined label '{goto}'", goto, str(goto)
+                )
+        last = args[2]["left"][-1] if args[2]["left"] else None
+        if not any(self._returns):
+            self._void[str(args[0])] = True
+        else:
+            ends = isinstance(last, dict) and last["root"] == "return"
+            self._void[str(args[0])] = False if ends else None
+        scope = self._locals | self._labels
+        self._unresolved.extend(use for use in self._uses if str(use) not in scope)
+        self._uses, self._gotos, self._returns = [], [], []
+        self._locals, self._labels = set(), set()
+        return super().function_definition(args)
+
+    def vector_definition(self, args) -> AST_Node:
+        self.__define(args[0])
+        return super().vector_definition(args)
+
+    def __define(self, name: Token) -> None:
+        if str(name) in self._definitions:
+            self.__report(
+                "duplicate_definition",
+                f"duplicate definition of '{name}'",
+                name,
+                str(name),
+            )
+        self._definitions.add(str(name))
+
+    def program(self, args) -> AST_Node:
+        for use in self._unresolved:
+            if str(use) not in self._definitions:
+                self.__report(
+                    "undefined_identifier", f"undefined identifier '{use}'", use, str(use)
+                )
+        for name in self._extrns:
+            if str(name) not in self._definitions:
+                self.__report(
+                    "undefined_extrn",
+                    f"extrn of '{name}' is not defined in this unit",
+                    name,
+                    str(name),
+                    "warning",
+                )
+        for callee, discarded in self._calls:
+            if discarded or self._void.get(str(callee), False) is False:
+                continue
+            if self._void[str(callee)] is True:
+                self.__report(
+                    "void_value",
+                    f"value of void function '{callee}' is used",
+                    callee,
+                    str(callee),
+                )
+            else:
+                self.__report(
+                    "void_value",
+                    f"value of '{callee}' is used, but it does not end with a return",
+                    callee,
+                    str(callee),
+                    "warning",
+                )
+        self._diagnostics.sort(key=lambda d: (d["line"] or 0, d["column"] or 0))
+        return super().program(args)
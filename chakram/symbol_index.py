@@ -0,0 +1,269 @@
+from __future__ import annotations
+from lark import Token, exceptions
+from chakram.parser import Parser
+from chakram.transformer import AST_Transformer, AST_Node
+from typing import TypedDict, Iterable, List, Optional, Tuple, Union
+import hashlib
+import os
+import sqlite3
+
+
+class Symbol_Location(TypedDict):
+    """A definition or extrn reference of a name in a project file"""
+
+    path: str
+    name: str
+    type: str
+    function: Optional[str]
+    line: Union[int, None]
+    column: Union[int, None]
+    start_pos: Union[int, None]
+
+
+_SCHEMA = """
+PRAGMA foreign_keys = ON;
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    hash TEXT NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    error TEXT
+);
+CREATE TABLE IF NOT EXISTS symbols (
+    file_id INTEGER NOT NULL REFERENCES files(id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    type TEXT NOT NULL,
+    function TEXT,
+    line INTEGER,
+    column INTEGER,
+    start_pos INTEGER
+);
+CREATE TABLE IF NOT EXISTS extrns (
+    file_id INTEGER NOT NULL REFERENCES files(id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    type TEXT NOT NULL,
+    function TEXT,
+    line INTEGER,
+    column INTEGER,
+    start_pos INTEGER
+);
+CREATE INDEX IF NOT EXISTS symbols_name ON symbols(name);
+CREATE INDEX IF NOT EXISTS symbols_file ON symbols(file_id);
+CREATE INDEX IF NOT EXISTS extrns_name ON extrns(name);
+CREATE INDEX IF NOT EXISTS extrns_file ON extrns(file_id);
+"""
+
+""" Symbols or extrns row: (name, type, function, line, column, start_pos). """
+_Row = Tuple[str, str, Optional[str], Optional[int], Optional[int], Optional[int]]
+
+
+class _Extrn_Transformer(AST_Transformer):
+    """AST transformer that keeps the name tokens of extrn statements.
+
+    Extrn names are flattened to lvalues without ``_meta``, so the tokens
+    are captured as they are transformed, with their enclosing function.
+    """
+
+    def __init__(self):
+        self.extrns: List[_Row] = []
+        self._pending: List[Token] = []
+        super().__init__()
+
+    def extrn_statement(self, args) -> AST_Node:
+        self._pending.extend(args)
+        return super().extrn_statement(args)
+
+    def function_definition(self, args) -> AST_Node:
+        function = args[0].value
+        for name in self._pending:
+            self.extrns.append(
+                (name.value, "extrn", function, name.line, name.column, name.start_pos)
+            )
+        self._pending = []
+        return super().function_definition(args)
+
+
+def _index_source_program(source_program: str) -> Tuple[List[_Row], List[_Row]]:
+    """Top-level definitions and extrn references of a source program."""
+    transformer = _Extrn_Transformer()
+    ast = transformer.transform(Parser(source_program).get_parse_tree())
+    symbol_table = transformer.get_symbol_table()
+    symbols: List[_Row] = []
+    for definition in ast["left"]:
+        name = str(definition["root"])
+        entry = symbol_table.get(name)
+        if entry is None:
+            symbols.append((name, str(definition["node"]), None, None, None, None))
+            continue
+        symbols.append(
+            (
+                name,
+                str(definition["node"]),
+                None,
+                entry["line"],
+                entry["column"],
+                entry["start_pos"],
+            )
+        )
+    return symbols, transformer.extrns
+
+
+class Symbol_Index:
+    """Persistent cross-file index of top-level symbols and extrn references.
+
+    Each indexed file stores its function and vector definitions, from the
+    ``Symbol_Table``, and the names of its ``extrn`` statements in a SQLite
+    database, together with a content hash. Updates re-parse only files
+    whose contents changed, and lookups are indexed queries.
+
+    Args:
+        database: Path of the SQLite database, or ":memory:"
+
+    Attributes:
+        connection: SQLite connection of the index.
+
+    """
+
+    def __init__(self, database: str = ":memory:") -> None:
+        self.connection = sqlite3.connect(database)
+        self.connection.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def __enter__(self) -> Symbol_Index:
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def update(self, paths: Iterable[str]) -> List[str]:
+        """Index new or changed files.
+
+        A file whose size and modification time are unchanged is skipped
+        without being read, and one whose content hash is unchanged is not
+        parsed again.
+
+        Args:
+            paths: Paths of B source files
+
+        Returns:
+            Paths of the files that were (re-)indexed
+
+        """
+        indexed = []
+        with self.connection:
+            for path in paths:
+                path = os.path.abspath(path)
+                if self.__update_file(path):
+                    indexed.append(path)
+        return indexed
+
+    def update_directory(self, directory: str, extension: str = ".b") -> List[str]:
+        """Index changed files below a directory and drop deleted ones."""
+        paths: List[str] = []
+        for root, _, files in os.walk(directory):
+            paths.extend(os.path.join(root, f) for f in files if f.endswith(extension))
+        prefix = os.path.join(os.path.abspath(directory), "")
+        existing = {os.path.abspath(path) for path in paths}
+        stale = [
+            path
+            for (path,) in self.connection.execute(
+                "SELECT path FROM files WHERE substr(path, 1, ?) = ?",
+                (len(prefix), prefix),
+            )
+            if path not in existing
+        ]
+        self.remove(stale)
+        return self.update(sorted(paths))
+
+    def remove(self, paths: Iterable[str]) -> None:
+        """Drop files from the index."""
+        with self.connection:
+            self.connection.executemany(
+                "DELETE FROM files WHERE path = ?",
+                [(os.path.abspath(path),) for path in paths],
+            )
+
+    def definitions(self, name: str) -> List[Symbol_Location]:
+        """Where is ``name`` defined"""
+        return self.__locations("symbols", name)
+
+    def references(self, name: str) -> List[Symbol_Location]:
+        """Who references ``name`` by extrn"""
+        return self.__locations("extrns", name)
+
+    def unresolved(self) -> List[Symbol_Location]:
+        """Extrn references to names not defined by any indexed file"""
+        return self.__query(
+            "SELECT path, e.name, e.type, e.function, e.line, e.column, e.start_pos "
+            "FROM extrns AS e JOIN files ON files.id = e.file_id "
+            "WHERE NOT EXISTS (SELECT 1 FROM symbols AS s WHERE s.name = e.name) "
+            "ORDER BY path, e.start_pos",
+            (),
+        )
+
+    def errors(self) -> List[Tuple[str, str]]:
+        """Files that failed to parse, and their syntax errors"""
+        return list(
+            self.connection.execute(
+                "SELECT path, error FROM files WHERE error IS NOT NULL ORDER BY path"
+            )
+        )
+
+    def __locations(self, table: str, name: str) -> List[Symbol_Location]:
+        return self.__query(
+            f"SELECT path, t.name, t.type, t.function, t.line, t.column, t.start_pos "
+            f"FROM {table} AS t JOIN files ON files.id = t.file_id "
+            f"WHERE t.name = ? ORDER BY path, t.start_pos",
+            (name,),
+        )
+
+    def __query(self, query: str, parameters: Tuple) -> List[Symbol_Location]:
+        keys = ("path", "name", "type", "function", "line", "column", "start_pos")
+        return [
+            dict(zip(keys, row))  # type: ignore
+            for row in self.connection.execute(query, parameters)
+        ]
+
+    def __update_file(self, path: str) -> bool:
+        status = os.stat(path)
+        row = self.connection.execute(
+            "SELECT id, hash, mtime_ns, size FROM files WHERE path = ?", (path,)
+        ).fetchone()
+        if row is not None and (row[2], row[3]) == (status.st_mtime_ns, status.st_size):
+            return False
+        with open(path, "rb") as file:
+            contents = file.read()
+        digest = hashlib.sha256(contents).hexdigest()
+        if row is not None and row[1] == digest:
+            self.connection.execute(
+                "UPDATE files SET mtime_ns = ?, size = ? WHERE id = ?",
+                (status.st_mtime_ns, status.st_size, row[0]),
+            )
+            return False
+
+        symbols: List[_Row] = []
+        extrns: List[_Row] = []
+        error = None
+        try:
+            symbols, extrns = _index_source_program(contents.decode())
+        except (exceptions.LarkError, UnicodeDecodeError) as e:
+            error = str(e)
+        if row is not None:
+            self.connection.execute("DELETE FROM files WHERE id = ?", (row[0],))
+        file_id = self.connection.execute(
+            "INSERT INTO files (path, hash, mtime_ns, size, error) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (path, digest, status.st_mtime_ns, status.st_size, error),
+        ).lastrowid
+        self.connection.executemany(
+            "INSERT INTO symbols VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(file_id, *symbol) for symbol in symbols],
+        )
+        self.connection.executemany(
+            "INSERT INTO extrns VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(file_id, *extrn) for extrn in extrns],
+        )
+        return True
@@ -1,6 +1,12 @@
 from __future__ import annotations
 from lark import Transformer, Discard, Tree, Token
+from lark.exceptions import VisitError
 from typing import TypedDict, Union, List, Optional, TypeVar, Literal, NotRequired, Dict
+from typing import Callable, Tuple, NoReturn
+from chakram.limits import Resource_Limits, Resource_Limit_Error, _Budget, CLOCK_INTERVAL
+from chakram.query import AST_Index
+import hashlib
+import sys
 
 T = TypeVar("T", bound="AST_Node")
 
@@ -37,6 +43,38 @@ Symbol_Table = Dict[str, _Meta]
 Definitions = List[AST_Node]
 
 
+class Frozen_Node(dict):
+    """Read-only AST node.
+
+    Leaf nodes shared between many parents by the interning mode of
+    ``AST_Transformer`` are frozen so that a consumer cannot corrupt every
+    occurrence of a leaf by mutating one of them. Frozen nodes print and
+    serialize exactly like plain dictionaries.
+    """
+
+    def __readonly(self, *args, **kwargs) -> NoReturn:
+        raise TypeError("shared AST nodes are read-only")
+
+    __setitem__ = __delitem__ = __ior__ = __readonly
+    clear = pop = popitem = setdefault = update = __readonly
+
+    def __reduce__(self):
+        return (Frozen_Node, (dict(self),))
+
+
+class Frozen_Operator(list):
+    """Read-only operator list (i.e. ``["+"]``) shared by interning."""
+
+    def __readonly(self, *args, **kwargs) -> NoReturn:
+        raise TypeError("shared AST operators are read-only")
+
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = __readonly
+    append = clear = extend = insert = pop = remove = reverse = sort = __readonly
+
+    def __reduce__(self):
+        return (Frozen_Operator, (list(self),))
+
+
 class AST_Transformer(Transformer):
     """
     AST transformer and visitor class.
@@ -47,16 +85,95 @@ class AST_Transformer(Transformer):
     or function. Functions contain expressions (rvalues) or statements. These
     are the mutual recursive branches we care about most. Lvalues and lvalue
     expressions are generally flattened, along with constant literals types.
+
+    With resource limits the ``nodes`` budget is checked as nodes are
+    constructed, and the clock of the ``seconds`` budget starts when the
+    transformer is created.
+
+    In flattening mode a run of the same associative binary operator, which
+    the grammar nests to the right (``a + (b + (c + d))``), becomes one
+    ``n_ary_expression`` node whose left is the list of operands. The run is
+    collected iteratively, so its length is not bound by the recursion
+    limit, and ``expand_n_ary_expressions`` restores the binary form.
+
+    In hashing mode each node is hashed as it is constructed, from its own
+    fields and the digests of its children, so each top-level definition has
+    its structural hash once constructed, see ``get_definition_hashes``.
+
+    In indexing mode every node of the AST is indexed by kind, and linked to
+    its parent, in one pass once it is constructed, see ``get_index``.
+
+    In consuming mode each parse tree node is emptied once it is
+    transformed, so the parse tree is freed as the AST is built rather than
+    after it, and is left empty.
     """
 
-    def __init__(self, use_meta=False):
+    def __init__(
+        self,
+        use_meta=False,
+        intern=False,
+        limits: Optional[Resource_Limits] = None,
+        flatten=False,
+        hashes=False,
+        index=False,
+        consume=False,
+    ):
         self._use_meta = use_meta
+        self._intern = intern
+        self._flatten = flatten
+        if flatten:
+            # bound only when flattening, the default path pays no extra call
+            self._transform_tree = self.__transform_flattened_tree  # type: ignore
+        self._hashes = hashes
+        self._definition_hashes = {}
+        self._digests = {}
+        self._indexing = index
+        self._index = None
+        if consume:
+            # wrap the tree hook in use, which is the flattening one with flatten
+            self.__transform_inner = self._transform_tree
+            self._transform_tree = self.__transform_consumed_tree  # type: ignore
         self._symbol_table = {}
+        self._leaves = {}
+        self._operators = {}
+        self._budget = _Budget(limits) if limits else None
+        self._max_nodes = (limits or {}).get("nodes", sys.maxsize)
+        self._nodes = 0
         super().__init__()
 
     """ Optionally construct meta table during recursive descent. """
     _use_meta: bool
 
+    """ Optionally intern names and share identical immutable leaf nodes. """
+    _intern: bool
+
+    """ Optionally flatten runs of an associative operator to n-ary nodes. """
+    _flatten: bool
+
+    """ Optionally hash the structure of top-level definitions. """
+    _hashes: bool
+
+    """ Structural hash of each top-level definition by name. """
+    _definition_hashes: Dict[str, str]
+
+    """ Node and its digest by node id, while hashing a transform. """
+    _digests: Dict[int, Tuple[AST_Node, str]]
+
+    """ Optionally index the nodes of the transformed AST by kind. """
+    _indexing: bool
+
+    """ Index of the last transformed AST, in indexing mode. """
+    _index: Optional[AST_Index]
+
+    """ Shared leaf nodes and operator lists of the interning mode. """
+    _leaves: Dict[Tuple[Node_Type, Node_Root], AST_Node]
+    _operators: Dict[str, Operator_Type]
+
+    """ Optional resource budget, and the number of constructed nodes. """
+    _budget: Optional[_Budget]
+    _max_nodes: int
+    _nodes: int
+
     """ Constructed global symbol table of lvalues. """
 
     _symbol_table: Symbol_Table
@@ -91,9 +208,137 @@ class AST_Transformer(Transformer):
         "unary_ones_complement": "~",
     }
 
+    """ Associative binary operators flattened to n-ary nodes. """
+    associative_operators = {
+        "or_operator",
+        "and_operator",
+        "bit_or_operator",
+        "bit_and_operator",
+        "xor_operator",
+        "add_operator",
+        "mul_operator",
+    }
+
+    def transform(self, tree: Tree) -> AST_Node:
+        """Transform a parse tree, raising exceeded resource limits as is."""
+        try:
+            ast = super().transform(tree)
+        except VisitError as e:
+            if isinstance(e.orig_exc, Resource_Limit_Error):
+                raise e.orig_exc from None
+            if isinstance(e.orig_exc, RecursionError) and self._budget is not None:
+                raise self._budget.depth_exceeded() from None
+            raise
+        except RecursionError:
+            if self._budget is None:
+                raise
+            raise self._budget.depth_exceeded() from None
+        finally:
+            self._digests = {}
+        if self._indexing is True:
+            self._index = AST_Index.from_ast(ast)
+        return ast
+
+    def __transform_flattened_tree(self, tree: Tree):
+        """Lark tree transform of the flattening mode, bound in __init__."""
+        if (
+            tree.data == "relation_expression"
+            and tree.children[1].data in self.associative_operators
+        ):
+            return self.__n_ary_expression(tree)
+        return super()._transform_tree(tree)
+
+    def __transform_consumed_tree(self, tree: Tree):
+        """Lark tree transform of the consuming mode, bound in __init__."""
+        node = self.__transform_inner(tree)
+        # the children were consumed by this hook, the list is all that is left
+        tree.children = []
+        tree._meta = None
+        return node
+
+    def __n_ary_expression(self, tree: Tree) -> AST_Node:
+        """Flatten the right-nested run of one operator without recursion."""
+        operator = tree.children[1].data
+        operands: List[Tree] = []
+        while True:
+            left, _, right = tree.children
+            operands.append(left)
+            inner = right.children[0]
+            if (
+                isinstance(inner, Tree)
+                and inner.data == "relation_expression"
+                and inner.children[1].data == operator
+            ):
+                tree = inner
+            else:
+                operands.append(right)
+                break
+        if len(operands) == 2:
+            return super()._transform_tree(tree)
+        return self.__construct_node(
+            [tree.children[1]],
+            "n_ary_expression",
+            self.__operator(self.operator_map[operator]),
+            left=[self._transform_tree(operand) for operand in operands],
+        )
+
     def get_symbol_table(self) -> Symbol_Table:
         return self._symbol_table
 
+    def get_definition_hashes(self) -> Dict[str, str]:
+        """Structural hash of each top-level definition, in hashing mode.
+
+        A later definition of the same name replaces an earlier one, as in
+        the symbol table.
+        """
+        return self._definition_hashes
+
+    def get_index(self) -> Optional[AST_Index]:
+        """Index of the nodes of the last transformed AST, in indexing mode."""
+        return self._index
+
+    def _define_symbol(self, name: str, entry: _Meta) -> None:
+        """Define, or redefine, a symbol table entry."""
+        self._symbol_table[name] = entry
+
+    def _declare_symbol(self, name: str, entry: _Meta) -> None:
+        """Add a symbol table entry for a name not yet in the table."""
+        if name not in self._symbol_table:
+            self._symbol_table[name] = entry
+
+    def _update_symbol(self, name: str, type: str, size: Optional[int] = None) -> None:
+        """Refine the type, and an unknown size, of an existing symbol."""
+        if name in self._symbol_table:
+            self._symbol_table[name]["type"] = type
+            if size is not None and "size" not in self._symbol_table[name]:
+                self._symbol_table[name]["size"] = size
+
+    def __name(self, name: str) -> str:
+        """Intern an identifier in interning mode."""
+        return sys.intern(str(name)) if self._intern else name
+
+    def __operator(self, operator: str) -> Operator_Type:
+        """Operator list factory, shared between nodes in interning mode."""
+        if self._intern is False:
+            return [operator]
+        if operator not in self._operators:
+            self._operators[operator] = Frozen_Operator([sys.intern(operator)])
+        return self._operators[operator]
+
+    def __share_leaf(self, node: AST_Node) -> AST_Node:
+        """Share identical immutable leaf nodes in interning mode.
+
+        Leaves that carry ``_meta`` are unique by position and never shared.
+        """
+        if self._intern is False or "_meta" in node:
+            return node
+        key = (node["node"], node["root"])
+        if key not in self._leaves:
+            self._leaves[key] = Frozen_Node(node)  # type: ignore
+            if self._hashes is True:
+                self.__hash_node(self._leaves[key])
+        return self._leaves[key]
+
     def __construct_node(
         self,
         token: Union[List[Tree], List[Token], AST_Node],
@@ -103,6 +348,11 @@ class AST_Transformer(Transformer):
         right: Optional[Node] = None,
     ) -> AST_Node:
         """AST Node factory method."""
+        if self._budget is not None:
+            self._nodes += 1
+            if self._nodes > self._max_nodes or self._nodes % CLOCK_INTERVAL == 0:
+                self._budget.check_nodes(self._nodes)
+
         node: AST_Node = {
             "node": type,
             "root": root,
@@ -134,8 +384,22 @@ class AST_Transformer(Transformer):
         if right is not None:
             node["right"] = right
 
+        if self._hashes is True:
+            self.__hash_node(node)
+
         return node
 
+    def __hash_node(self, node: AST_Node) -> None:
+        """Combine the digest of a node from those of its children."""
+        self._digests[id(node)] = (node, _node_digest(node, self.__child_digest))
+
+    def __child_digest(self, node: AST_Node) -> str:
+        """Digest of a constructed node, or of a subtree built otherwise."""
+        entry = self._digests.get(id(node))
+        if entry is not None and entry[0] is node:
+            return entry[1]
+        return _node_digest(node, self.__child_digest)
+
     """Program Root. """
 
     def program(self, args) -> AST_Node:
@@ -145,6 +409,8 @@ class AST_Transformer(Transformer):
 
     def definition(self, args) -> AST_Node:
         """Passthrough"""
+        if self._hashes is True:
+            self._definition_hashes[str(args[0]["root"])] = self.__child_digest(args[0])
         return args[0]
 
     def v_size(self, args) -> AST_Node:
@@ -157,7 +423,7 @@ class AST_Transformer(Transformer):
 
     def function_definition(self, args) -> AST_Node:
         if isinstance(args[0], Token):
-            self._symbol_table[str(args[0].value)] = {
+            entry: _Meta = {
                 "type": "function_definition",
                 "line": args[0].line,
                 "start_pos": args[0].start_pos,
@@ -171,20 +437,21 @@ class AST_Transformer(Transformer):
                     len(args[2]["left"][-1:]) > 0
                     and args[2]["left"][-1:][0]["root"] == "return"
                 ):
-                    self._symbol_table[str(args[0].value)]["void"] = False
+                    entry["void"] = False
             else:
-                self._symbol_table[str(args[0].value)]["void"] = True
+                entry["void"] = True
+            self._define_symbol(self.__name(args[0].value), entry)
         return self.__construct_node(
             args,
             "function_definition",
-            args[0].value,
+            self.__name(args[0].value),
             left=args[1].children,
             right=args[2],
         )
 
     def vector_definition(self, args) -> AST_Node:
         if isinstance(args[0], Token):
-            self._symbol_table[str(args[0].value)] = {
+            entry: _Meta = {
                 "type": "vector_definition",
                 "line": args[0].line,
                 "start_pos": args[0].start_pos,
@@ -193,10 +460,15 @@ class AST_Transformer(Transformer):
                 "end_column": args[0].end_column,
             }
             if args[1] is not None:
-                self._symbol_table[str(args[0].value)]["size"] = int(args[1]["root"])
+                entry["size"] = int(args[1]["root"])
+            self._define_symbol(self.__name(args[0].value), entry)
 
         return self.__construct_node(
-            args, "vector_definition", args[0].value, left=args[1], right=args[2:]
+            args,
+            "vector_definition",
+            self.__name(args[0].value),
+            left=args[1],
+            right=args[2:],
         )
 
     """ Mutual-recursive Branches. """
@@ -260,14 +532,17 @@ class AST_Transformer(Transformer):
 
     def label_statement(self, args) -> AST_Node:
         if isinstance(args[0], Token):
-            self._symbol_table[args[0].value[:-1]] = {
-                "type": "label",
-                "line": args[0].line,
-                "start_pos": args[0].start_pos,
-                "column": args[0].column,
-                "end_pos": args[0].end_pos,
-                "end_column": args[0].end_column,
-            }
+            self._define_symbol(
+                self.__name(args[0].value[:-1]),
+                {
+                    "type": "label",
+                    "line": args[0].line,
+                    "start_pos": args[0].start_pos,
+                    "column": args[0].column,
+                    "end_pos": args[0].end_pos,
+                    "end_column": args[0].end_column,
+                },
+            )
         return self.__construct_statement_node(args, "label", left=[args[0][:-1]])
 
     def extrn_statement(self, args) -> AST_Node:
@@ -298,7 +573,7 @@ class AST_Transformer(Transformer):
         return self.__construct_node(
             args,
             "relation_expression",
-            [self.operator_map[args[1].data]],
+            self.__operator(self.operator_map[args[1].data]),
             left=args[0],
             right=args[2],
         )
@@ -320,7 +595,7 @@ class AST_Transformer(Transformer):
         return self.__construct_node(
             args,
             "unary_expression",
-            [self.operator_map[args[0].data.value]],
+            self.__operator(self.operator_map[args[0].data.value]),
             left=args[1],
         )
 
@@ -331,13 +606,15 @@ class AST_Transformer(Transformer):
         return self.__construct_node(args, "evaluated_expression", args[0])
 
     def address_of_expression(self, args) -> AST_Node:
-        return self.__construct_node(args, "address_of_expression", ["&"], left=args[1])
+        return self.__construct_node(
+            args, "address_of_expression", self.__operator("&"), left=args[1]
+        )
 
     def post_inc_dec_expression(self, args) -> AST_Node:
         return self.__construct_node(
             args,
             "post_inc_dec_expression",
-            [self.operator_map[args[1].data.value]],
+            self.__operator(self.operator_map[args[1].data.value]),
             right=args[0],
         )
 
@@ -345,7 +622,7 @@ class AST_Transformer(Transformer):
         return self.__construct_node(
             args,
             "pre_inc_dec_expression",
-            [self.operator_map[args[0].data.value]],
+            self.__operator(self.operator_map[args[0].data.value]),
             left=args[1],
         )
 
@@ -355,44 +632,45 @@ class AST_Transformer(Transformer):
         )
 
     def assignment_operator(self, args) -> Operator_Type:
-        return ["="]
+        return self.__operator("=")
 
     """ Inline Lvalue grammar productions. """
 
     def __to_identifier(self, args) -> AST_Node:
-        return self.__construct_node(args, "lvalue", args.value)
+        return self.__share_leaf(
+            self.__construct_node(args, "lvalue", self.__name(args.value))
+        )
 
     def identifier(self, args) -> AST_Node:
-        node = self.__construct_node(args, "lvalue", args[0].value)
-        if not args[0].value in self._symbol_table:
-            self._symbol_table[args[0].value] = {
+        name = self.__name(args[0].value)
+        node = self.__share_leaf(self.__construct_node(args, "lvalue", name))
+        self._declare_symbol(
+            name,
+            {
                 "type": "lvalue",
                 "line": args[0].line,
                 "start_pos": args[0].start_pos,
                 "column": args[0].column,
                 "end_pos": args[0].end_pos,
                 "end_column": args[0].end_column,
-            }
+            },
+        )
         return node
 
     def indirect_identifier(self, args) -> AST_Node:
-        node = self.__construct_node(args, "indirect_lvalue", ["*"], left=args[1])
-        if isinstance(args[1]["root"], str) and args[1]["root"] in self._symbol_table:
-            self._symbol_table[args[1]["root"]]["type"] = "indirect_lvalue"
+        node = self.__construct_node(
+            args, "indirect_lvalue", self.__operator("*"), left=args[1]
+        )
+        if isinstance(args[1]["root"], str):
+            self._update_symbol(args[1]["root"], "indirect_lvalue")
         return node
 
     def vector_identifier(self, args) -> AST_Node:
         node = self.__construct_node(
             args, "vector_lvalue", args[0]["root"], left=args[1]
         )
-        name = args[0]["root"]
-        if name in self._symbol_table:
-            self._symbol_table[name]["type"] = "vector_lvalue"
-            if (
-                isinstance(args[1]["root"], int)
-                and "size" not in self._symbol_table[name]
-            ):
-                self._symbol_table[name]["size"] = args[1]["root"]
+        size = args[1]["root"] if isinstance(args[1]["root"], int) else None
+        self._update_symbol(args[0]["root"], "vector_lvalue", size)
         return node
 
     """ Constants. """
@@ -404,7 +682,9 @@ class AST_Transformer(Transformer):
         root: Node_Root,
     ) -> AST_Node:
         """Constant Literal AST Node factory method."""
-        return self.__construct_node(token, type, root, left=None, right=None)
+        return self.__share_leaf(
+            self.__construct_node(token, type, root, left=None, right=None)
+        )
 
     def integer_literal(self, args) -> AST_Node:
         return self.__construct_constant_node(
@@ -432,3 +712,95 @@ class AST_Transformer(Transformer):
     def SEMI_COLON(self, name):
         """Throw away ';'"""
         return Discard
+
+
+def expand_n_ary_expressions(node):
+    """Expand the n-ary nodes of a flattened AST back to the binary form.
+
+    Operands are folded to the right, as the grammar nests them, so the
+    expansion of a flattened AST is equal to the AST built without
+    flattening. The input is not modified.
+
+    Args:
+        node: AST, or any list or node of an AST
+
+    Returns:
+        The AST with relation expressions in place of n-ary expressions
+
+    """
+    if isinstance(node, list):
+        return [expand_n_ary_expressions(item) for item in node]
+    if not isinstance(node, dict) or isinstance(node, Frozen_Node):
+        return node
+    if node.get("node") == "n_ary_expression":
+        operands = [expand_n_ary_expressions(operand) for operand in node["left"]]
+        expression = operands.pop()
+        while operands:
+            expression = {
+                "node": "relation_expression",
+                "root": list(node["root"]),
+                "left": operands.pop(),
+                "right": expression,
+            }
+        return expression
+    return {key: expand_n_ary_expressions(value) for key, value in node.items()}
+
+
+def _encode_structure(value, parts: List[str], digest: Callable[[AST_Node], str]) -> None:
+    if isinstance(value, str):
+        parts.append(f"s{len(value)}:{value}")
+    elif isinstance(value, dict):
+        parts.append(f"#{digest(value)}")  # type: ignore
+    elif isinstance(value, list):
+        parts.append("[")
+        for item in value:
+            _encode_structure(item, parts, digest)
+        parts.append("]")
+    else:
+        parts.append(f"{type(value).__name__}:{value!r}")
+
+
+def _node_digest(node: AST_Node, digest: Callable[[AST_Node], str]) -> str:
+    """Digest of the fields of a node, given the digest of each child node."""
+    parts: List[str] = []
+    for key, value in node.items():
+        if key == "_meta":
+            continue
+        parts.append(key)
+        # node kinds, roots and children inline, the rest is rare
+        if isinstance(value, str):
+            parts.append(f"s{len(value)}:{value}")
+        elif isinstance(value, dict):
+            parts.append(f"#{digest(value)}")  # type: ignore
+        else:
+            _encode_structure(value, parts, digest)
+    encoded = "\x1f".join(parts).encode("utf-8", "surrogatepass")
+    return hashlib.blake2b(encoded, digest_size=16).hexdigest()
+
+
+def _structural_digest(node: AST_Node) -> str:
+    return _node_digest(node, _structural_digest)
+
+
+def structural_hash(node) -> str:
+    """Hash the structure of an AST, ignoring source positions.
+
+    Node kinds, roots, operators and literal values are hashed, and
+    ``_meta`` is not, so moving or reformatting code keeps its hash while
+    any semantic change to it does not. The digest of a node combines those
+    of its children, which is how the hashing mode of ``AST_Transformer``
+    computes it incrementally.
+
+    Args:
+        node: AST, or any list or node of an AST
+
+    Returns:
+        Hexadecimal BLAKE2b digest
+
+    """
+    if isinstance(node, dict):
+        return _structural_digest(node)  # type: ignore
+    parts: List[str] = []
+    _encode_structure(node, parts, _structural_digest)
+    encoded = "\x1f".join(parts).encode("utf-8", "surrogatepass")
+    return hashlib.blake2b(encoded, digest_size=16).hexdigest()
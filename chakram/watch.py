@@ -0,0 +1,184 @@
+from __future__ import annotations
+from lark import exceptions
+from chakram.parser import Parser
+from chakram.transformer import AST_Transformer, AST_Node, Symbol_Table
+from typing import TypedDict, Dict, List, Optional, TextIO, Tuple, Union, Literal
+from typing import NotRequired
+import hashlib
+import json
+import os
+import sys
+import time
+
+
+class Diagnostic(TypedDict):
+    message: str
+    line: Union[int, None]
+    column: Union[int, None]
+
+
+class Watch_Event(TypedDict):
+    """A change of a watched file and its new result"""
+
+    path: str
+    event: Literal["changed", "removed", "error"]
+    ast: NotRequired[AST_Node]
+    symbols: NotRequired[Symbol_Table]
+    diagnostics: NotRequired[List[Diagnostic]]
+
+
+""" Stat signature and content hash of a file: (mtime_ns, size, sha256). """
+_Signature = Tuple[int, int, str]
+
+
+class Watcher:
+    """Poll a directory and re-parse only the B files that changed.
+
+    Files are polled by modification time and size, with no OS specific
+    notifier; contents are hashed only when those change, and parsed only
+    when the hash changes. The parser tables stay warm and the latest
+    result of every file is kept in memory.
+
+    Args:
+        directory: Directory to watch recursively.
+        symbols: Emit symbol tables instead of ASTs.
+        meta: Enable semantic meta data flag.
+        output: Optional directory to write results to, instead of a stream.
+        extension: Extension of B source files.
+
+    Attributes:
+        results: Latest event of every watched file.
+
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        symbols=False,
+        meta=False,
+        output: Optional[str] = None,
+        extension=".b",
+    ) -> None:
+        self.directory = directory
+        self.symbols = symbols
+        self.meta = meta
+        self.output = output
+        self.extension = extension
+        self.results: Dict[str, Watch_Event] = {}
+        self._signatures: Dict[str, _Signature] = {}
+
+    def scan(self) -> List[Watch_Event]:
+        """Poll the directory once.
+
+        Returns:
+            Events of the files that were added, changed or removed
+
+        """
+        events: List[Watch_Event] = []
+        seen = set()
+        for path, status in self.__walk(self.directory):
+            seen.add(path)
+            if status is None:
+                continue
+            signature = self._signatures.get(path)
+            if signature is not None and signature[:2] == status:
+                continue
+            try:
+                with open(path, "rb") as file:
+                    contents = file.read()
+            except OSError:
+                continue
+            digest = hashlib.sha256(contents).hexdigest()
+            self._signatures[path] = (*status, digest)
+            if signature is not None and signature[2] == digest:
+                continue
+            events.append(self.__parse(path, contents))
+
+        for path in [path for path in self._signatures if path not in seen]:
+            del self._signatures[path]
+            self.results.pop(path, None)
+            events.append({"path": path, "event": "removed"})
+
+        for event in events:
+            if event["event"] != "removed":
+                self.results[event["path"]] = event
+        return events
+
+    def run(self, interval=0.5, stream: TextIO = sys.stdout, polls=None) -> None:
+        """Poll until interrupted, writing each event as it happens.
+
+        Events are written as JSON lines to the stream or, with an output
+        directory, as one JSON file per source file.
+
+        Args:
+            interval: Seconds to sleep between polls
+            stream: Text stream for events
+            polls: Optional number of polls, for testing
+
+        """
+        polled = 0
+        while polls is None or polled < polls:
+            if polled > 0:
+                time.sleep(interval)
+            for event in self.scan():
+                self.__emit(event, stream)
+            polled += 1
+
+    def __walk(self, directory: str):
+        # a file deleted or renamed once listed, i.e. by an editor save, has
+        # no status and is left as is, the next poll finds it or its removal
+        try:
+            listing = os.scandir(directory)
+        except OSError:
+            return
+        with listing as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    yield from self.__walk(entry.path)
+                elif entry.name.endswith(self.extension):
+                    try:
+                        status = entry.stat()
+                    except OSError:
+                        yield entry.path, None
+                        continue
+                    yield entry.path, (status.st_mtime_ns, status.st_size)
+
+    def __parse(self, path: str, contents: bytes) -> Watch_Event:
+        try:
+            tree = Parser(contents.decode()).get_parse_tree()
+            transformer = AST_Transformer(use_meta=self.meta)
+            ast = transformer.transform(tree)
+        except exceptions.UnexpectedInput as e:
+            return {
+                "path": path,
+                "event": "error",
+                "diagnostics": [{"message": str(e), "line": e.line, "column": e.column}],
+            }
+        except (exceptions.LarkError, UnicodeDecodeError) as e:
+            return {
+                "path": path,
+                "event": "error",
+                "diagnostics": [{"message": str(e), "line": None, "column": None}],
+            }
+        if self.symbols:
+            return {
+                "path": path,
+                "event": "changed",
+                "symbols": transformer.get_symbol_table(),
+            }
+        return {"path": path, "event": "changed", "ast": ast}
+
+    def __emit(self, event: Watch_Event, stream: TextIO) -> None:
+        if self.output is None:
+            print(json.dumps(event), file=stream, flush=True)
+            return
+        relative = os.path.relpath(event["path"], self.directory)
+        target = os.path.join(self.output, relative + ".json")
+        if event["event"] == "removed":
+            if os.path.exists(target):
+                os.remove(target)
+        else:
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with open(target, "w") as file:
+                json.dump(event, file)
+        print(f"{event['event']} {event['path']}", file=stream, flush=True)
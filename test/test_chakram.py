@@ -1,5 +1,6 @@
 import pytest
 from os import getcwd
+from typing import List
 
 from chakram import __version__
 from chakram.parser import Parser, Syntax_Error
@@ -13,6 +14,16 @@ from chakram.parser import (
     get_source_program_ast_as_string,
     get_source_program_ast_as_json,
 )
+from chakram.parser import get_source_program_as_ir, get_source_program_ir_as_json
+from chakram.parser import tokenize_source_program, get_source_program_ast_index
+from chakram.parser import get_source_program_diagnostics
+from chakram.limits import Resource_Limit_Error, Resource_Limits
+from chakram.ir import Op, format_ir
+from chakram.diff import definition_hashes, diff_asts, diff_source_programs
+from chakram.parallel import get_source_program_as_ast_in_parallel
+from chakram.parallel import split_source_program
+from chakram.symbol_index import Symbol_Index
+from chakram.watch import Watcher
 from .fixture.program_1_parse_tree import program_example_1_parse_tree
 from .fixture.program_2_parse_tree import program_example_2_parse_tree
 from .fixture.program_3_parse_tree import program_example_3_parse_tree
@@ -138,3 +149,515 @@ def test_get_source_program_symbol_table_as_json(
             program_example_1_ast_symbols_as_json
             == get_source_program_symbol_table_as_json(test_contents)
         )
+
+
+def test_get_source_program_as_ast_interned(program_example_1_ast: str) -> None:
+    with open(getcwd() + "/examples/1.b") as file:
+        contents = file.read()
+        ast = get_source_program_as_ast(contents, intern=True)
+        assert str(ast) == program_example_1_ast
+        assert get_source_program_ast_as_json(
+            contents, intern=True
+        ) == get_source_program_ast_as_json(contents)
+
+        parameters = ast["left"][1]["left"]
+        returned = ast["left"][1]["right"]["left"][0]["left"][0]
+        assert parameters[0] is returned
+        with pytest.raises(TypeError):
+            returned["root"] = "b"
+
+        meta = get_source_program_as_ast(contents, meta=True, intern=True)
+        parameters = meta["left"][1]["left"]
+        assert parameters[0] is not meta["left"][1]["right"]["left"][0]["left"][0]
+
+
+def test_get_source_program_as_ir() -> None:
+    import json
+
+    with open(getcwd() + "/examples/simple.b") as file:
+        contents = file.read()
+        ir = get_source_program_as_ir(contents)
+        assert format_ir(ir).splitlines() == [
+            'mess[1] "too bad"',
+            "main():",
+            "    AUTO j _ _",
+            "    MOV j 0 _",
+            "    LABEL .L0 _ _",
+            "    LE t0 j 5",
+            "    JUMP_FALSE .L1 t0 _",
+            "    PARAM _ 'a' _",
+            "    CALL t1 putchar 1",
+            "    MOV t2 j _",
+            "    ADD t3 j 1",
+            "    MOV j t3 _",
+            "    JUMP .L0 _ _",
+            "    LABEL .L1 _ _",
+        ]
+        assert ir["functions"][0]["temporaries"] == 4
+        serialized = json.loads(get_source_program_ir_as_json(contents))
+        assert serialized["functions"][0]["code"] == ir["functions"][0]["code"].tolist()
+
+    with open(getcwd() + "/examples/2.b") as file:
+        code = get_source_program_as_ir(file.read())["functions"][0]["code"]
+        assert Op.BREAK not in code[::4]
+
+    with open(getcwd() + "/test/fixture/bad.b") as file:
+        with pytest.raises(Syntax_Error):
+            get_source_program_as_ir(file.read())
+
+    from chakram.ir import IR_Transformer
+
+    # the clock of the seconds budget is also checked while lowering
+    tree = parse_source_program("main() { x = 1; }" * 200)
+    with pytest.raises(Resource_Limit_Error) as error:
+        IR_Transformer(limits={"seconds": 0}).transform(tree)
+    assert error.value.limit == "seconds"
+
+
+def test_get_source_program_as_ir_large_integers() -> None:
+    for value in (2**60 - 1, 2**60, 2**64):
+        program = get_source_program_as_ir(f"main() {{ x = {value}; }}")
+        listing = format_ir(program)
+        assert str(value) in listing
+        assert (value in program["constants"]) == (value >= 2**60)
+
+
+def test_split_source_program() -> None:
+    source = 'a [2] "}", \'{\';\n/* } */ f() { if (1) { x; } }  // }\ng() {}'
+    boundaries = [source.index(";") + 1, source.index("}  //") + 1, len(source)]
+    assert split_source_program(source) == boundaries
+    assert split_source_program("f() { x;") is None
+
+
+def test_get_source_program_as_ast_in_parallel() -> None:
+    import json
+    from concurrent.futures import ThreadPoolExecutor
+    from chakram.transformer import AST_Transformer
+
+    for example in ["/examples/1.b", "/examples/2.b", "/test/fixture/call.b"]:
+        with open(getcwd() + example) as file:
+            contents = file.read()
+            transformer = AST_Transformer(use_meta=True)
+            ast = transformer.transform(Parser(contents).get_parse_tree())
+            expected = json.dumps([ast, transformer.get_symbol_table()])
+            with ThreadPoolExecutor(max_workers=3) as executor:
+                result = get_source_program_as_ast_in_parallel(
+                    contents, meta=True, workers=3, executor=executor
+                )
+                assert json.dumps(result) == expected
+
+    with open(getcwd() + "/examples/1.b") as file:
+        contents = file.read()
+        ast, _ = get_source_program_as_ast_in_parallel(contents, workers=2)
+        assert str(ast) == str(get_source_program_as_ast(contents))
+
+    with open(getcwd() + "/test/fixture/bad.b") as file:
+        with pytest.raises(Syntax_Error):
+            contents = "main() {}\n" + file.read()
+            get_source_program_as_ast_in_parallel(contents, workers=2)
+
+
+def test_get_source_program_as_ast_in_threads() -> None:
+    import sys
+    from concurrent.futures import ThreadPoolExecutor
+
+    tracebacklimit = getattr(sys, "tracebacklimit", None)
+    sources = []
+    for example in ["/examples/1.b", "/examples/2.b", "/examples/3.b"]:
+        with open(getcwd() + example) as file:
+            sources.append(file.read())
+    expected = [get_source_program_ast_as_json(source, True) for source in sources]
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        results = list(
+            executor.map(get_source_program_ast_as_json, sources * 8, [True] * 24)
+        )
+    assert results == expected * 8
+    assert getattr(sys, "tracebacklimit", None) == tracebacklimit
+
+
+def test_get_source_program_as_ast_with_limits(program_example_1_ast: str) -> None:
+    limits: Resource_Limits = {
+        "bytes": 1 << 20,
+        "tokens": 1 << 20,
+        "depth": 1000,
+        "nodes": 1 << 20,
+    }
+    with open(getcwd() + "/examples/1.b") as file:
+        contents = file.read()
+        assert get_source_program_as_ast(contents, True, limits=limits) == (
+            get_source_program_as_ast(contents, True)
+        )
+
+        exceeded: List[Resource_Limits] = [{"bytes": 100}, {"tokens": 10}, {"nodes": 10}]
+        for limits in exceeded:
+            ((limit, maximum),) = limits.items()
+            with pytest.raises(Resource_Limit_Error) as error:
+                get_source_program_as_ast(contents, limits=limits)
+            assert error.value.limit == limit
+            assert error.value.maximum == maximum
+            assert error.value.value > maximum
+
+    nested = "main() { x = " + "(" * 500 + "1" + ")" * 500 + "; }"
+    with pytest.raises(Resource_Limit_Error) as error:
+        parse_source_program(nested, limits={"depth": 100})
+    assert (error.value.limit, error.value.line) == ("depth", 1)
+    with pytest.raises(Resource_Limit_Error) as error:
+        parse_source_program(nested * 50, limits={"seconds": 0})
+    assert error.value.limit == "seconds"
+    with pytest.raises(Syntax_Error):
+        parse_source_program("main() { x = 1 ", limits={"tokens": 100})
+
+    # within the depth limit of the parser, beyond the stack of the transform
+    readme: Resource_Limits = {
+        "bytes": 1 << 20,
+        "tokens": 100_000,
+        "depth": 500,
+        "nodes": 200_000,
+        "seconds": 2.0,
+    }
+    nested = "main() { x = " + "(" * 300 + "1" + ")" * 300 + "; }"
+    for get_source_program in (get_source_program_as_ast, get_source_program_as_ir):
+        with pytest.raises(Resource_Limit_Error) as error:
+            get_source_program(nested, limits=readme)
+        assert (error.value.limit, error.value.maximum) == ("depth", 500)
+
+
+def test_get_source_program_as_ast_flattened() -> None:
+    from chakram.transformer import expand_n_ary_expressions
+
+    for example in ["/examples/1.b", "/examples/label.b", "/test/fixture/call.b"]:
+        with open(getcwd() + example) as file:
+            contents = file.read()
+            for meta in (False, True):
+                flattened = get_source_program_as_ast(contents, meta, flatten=True)
+                assert expand_n_ary_expressions(flattened) == (
+                    get_source_program_as_ast(contents, meta)
+                )
+
+    chain = " + ".join(f"a{i}" for i in range(2000))
+    source = f"main() {{ x = {chain} * b * c - d; }}"
+    ast = get_source_program_as_ast(source, flatten=True)
+    expression = ast["left"][0]["right"]["left"][0]["left"][0][0]["right"]
+    assert expression["node"] == "n_ary_expression"
+    assert expression["root"] == ["+"]
+    assert len(expression["left"]) == 2000
+    assert expression["left"][-1]["root"] == ["*"]
+    assert [operand["node"] for operand in expression["left"][-1]["left"]] == [
+        "lvalue",
+        "lvalue",
+        "relation_expression",
+    ]
+
+
+def test_diff_source_programs() -> None:
+    from chakram.transformer import AST_Transformer
+
+    with open(getcwd() + "/examples/1.b") as file:
+        old = file.read()
+    new = old.replace("m = 0;", "m = 1;").replace(
+        "char(a,b) {\n   return (a);\n}", "char(a,b) { return (a); }\nv[3] 1, 2, 3;"
+    )
+    assert diff_source_programs(old, "\n\n" + old) == {
+        "added": [],
+        "removed": [],
+        "modified": [],
+        "unchanged": ["main", "char", "convert"],
+        "symbols": [],
+    }
+    diff = diff_source_programs(old, new)
+    assert diff["added"] == ["v"]
+    assert diff["removed"] == []
+    assert diff["modified"] == ["convert"]
+    assert diff["unchanged"] == ["main", "char"]
+    assert [(s["name"], s["change"]) for s in diff["symbols"]] == [("v", "modified")]
+    assert diff["symbols"][0]["new"]["size"] == 3
+    assert diff_source_programs(new, old)["removed"] == ["v"]
+    assert diff_asts(
+        get_source_program_as_ast(old, meta=True), get_source_program_as_ast(new)
+    )["modified"] == ["convert"]
+    # combined node by node, the hashes equal those of the finished AST
+    transformer = AST_Transformer(intern=True, flatten=True, hashes=True)
+    ast = transformer.transform(Parser(new).get_parse_tree())
+    assert transformer.get_definition_hashes() == definition_hashes(ast)
+
+
+def test_get_source_program_ast_index() -> None:
+    from chakram.query import AST_Index
+    from chakram.transformer import AST_Transformer
+
+    with open(getcwd() + "/examples/1.b") as file:
+        contents = file.read() + (
+            "main2() { auto v[3]; v[1] = printf(x); if (x) while (y) f(1); }"
+        )
+    index = get_source_program_ast_index(contents)
+    assert index.root == get_source_program_as_ast(contents)
+    calls = index.select("function_expression")
+    assert [call["root"] for call in calls] == ["char", "printf", "printf", "f"]
+    assert [n["root"] for n in index.select("statement[while] function_expression")] == [
+        "f"
+    ]
+    assert index.select("function_definition[main2] > function_expression") == []
+    assert len(index.select("function_definition[convert] > statement > statement[if]"))
+    assigned = index.select(
+        "assignment_expression",
+        where=lambda node: isinstance(node["left"], dict)
+        and node["left"]["node"] == "vector_lvalue",
+    )
+    assert len(assigned) == 2
+    parent = index.parent(calls[2])
+    assert parent is not None and parent["node"] == "assignment_expression"
+    assert [node["node"] for node in index.ancestors(calls[2])][-2:] == [
+        "function_definition",
+        "program",
+    ]
+    assert index.select("function_expression") == calls
+
+    walked = AST_Index.from_ast(index.root)
+    for kind in index.kinds():
+        assert {id(node) for node in walked.nodes(kind)} == {
+            id(node) for node in index.nodes(kind)
+        }
+    with pytest.raises(ValueError):
+        index.select("statement >")
+
+    # a shared leaf has every node that references it as a parent
+    transformer = AST_Transformer(intern=True, index=True)
+    transformer.transform(Parser("f() { x = 1; } g() { y = x; }").get_parse_tree())
+    shared = transformer.get_index()
+    assert shared is not None
+    leaf = shared.nodes("lvalue")[0]
+    assert [parent["node"] for parent in shared.parents(leaf)] == [
+        "assignment_expression",
+        "assignment_expression",
+    ]
+    assert len(shared.select("function_definition[f] lvalue[x]")) == 1
+
+
+def test_get_source_program_as_ast_lean(program_example_1_ast: str) -> None:
+    from mmap import mmap, ACCESS_READ
+
+    with open(getcwd() + "/examples/1.b", "rb") as file:
+        with mmap(file.fileno(), 0, access=ACCESS_READ) as source:
+            ast = get_source_program_as_ast(source, lean=True)
+            assert str(ast) == program_example_1_ast
+            assert get_source_program_symbol_table(
+                source, lean=True
+            ) == get_source_program_symbol_table(source)
+        contents = file.read()
+    parser = Parser(contents, lean=True)
+    assert parser.source is None
+    tree = parser.release_parse_tree()
+    assert parser.get_parse_tree() is None
+    with pytest.raises(ValueError):
+        parser.release_parse_tree()
+    from chakram.transformer import AST_Transformer
+
+    assert AST_Transformer(consume=True).transform(tree) == ast
+    assert tree.children == []
+
+
+def test_get_source_program_diagnostics() -> None:
+    from chakram.semantic import Semantic_Transformer
+
+    with open(getcwd() + "/examples/1.b") as file:
+        contents = file.read()
+    assert get_source_program_diagnostics(contents) == []
+    checker = Semantic_Transformer()
+    assert checker.transform(Parser(contents).get_parse_tree()) == (
+        get_source_program_as_ast(contents)
+    )
+
+    diagnostics = get_source_program_diagnostics(
+        "f() { }\n"
+        "g(*a) { auto x; extrn h; x = f(); f(); y = a; goto nowhere; break; }\n"
+        "g() { while (1) break; switch (x) { case 1: break; } }\n"
+    )
+    assert [(d["code"], d["name"], d["severity"], d["line"]) for d in diagnostics] == [
+        ("undefined_extrn", "h", "warning", 2),
+        ("void_value", "f", "error", 2),
+        ("undefined_identifier", "y", "error", 2),
+        ("undefined_label", "nowhere", "error", 2),
+        ("break_outside_loop", None, "error", 2),
+        ("duplicate_definition", "g", "error", 3),
+        ("undefined_identifier", "x", "error", 3),
+    ]
+    with pytest.raises(Syntax_Error):
+        get_source_program_diagnostics("f() { x = ; }")
+
+    diagnostics = get_source_program_diagnostics(
+        "f() { return; }\n"
+        "g(a) { if (a) return (1); }\n"
+        "h() { return (1); }\n"
+        "main() { auto x; x = f(); x = g(1) + h(); }\n"
+    )
+    assert [(d["code"], d["name"], d["severity"]) for d in diagnostics] == [
+        ("void_value", "f", "error"),
+        ("void_value", "g", "warning"),
+    ]
+
+
+def test_symbol_index(tmp_path) -> None:
+    import os
+
+    library, program = tmp_path / "library.b", tmp_path / "program.b"
+    library.write_text("count [1] 0;\nincr() {\n  count++;\n}\n")
+    program.write_text("main() {\n  extrn count, incr, missing;\n  incr();\n}\n")
+    with Symbol_Index(str(tmp_path / "index.db")) as index:
+        assert len(index.update_directory(str(tmp_path))) == 2
+        assert index.update_directory(str(tmp_path)) == []
+
+        [definition] = index.definitions("count")
+        assert definition["path"] == str(library)
+        assert definition["type"] == "vector_definition"
+        assert (definition["line"], definition["column"]) == (1, 1)
+        [reference] = index.references("incr")
+        assert reference["function"] == "main"
+        assert (reference["line"], reference["column"]) == (2, 16)
+        assert [r["name"] for r in index.unresolved()] == ["missing"]
+
+        program.write_text("main() {\n  extrn count;\n}\nmissing() {}\n")
+        os.utime(program, ns=(0, 0))
+        assert index.update([str(library), str(program)]) == [str(program)]
+        assert index.references("incr") == []
+        assert index.unresolved() == []
+
+        library.unlink()
+        index.update_directory(str(tmp_path))
+        assert index.definitions("count") == []
+
+        program.write_text("int main() {}")
+        index.update([str(program)])
+        assert index.errors()[0][0] == str(program)
+
+
+def test_export_corpus_columns(tmp_path) -> None:
+    from chakram.columnar import export_corpus_columns, Corpus_Columns
+
+    bad = tmp_path / "bad.b"
+    bad.write_text("main() { x = ; }")
+    example = getcwd() + "/examples/1.b"
+    location = str(tmp_path / "corpus.columns")
+    header = export_corpus_columns([example, str(bad)], location)
+    assert header["files"] == [example, str(bad)]
+    assert list(header["errors"]) == [str(bad)]
+
+    with open(example) as file:
+        symbol_table = get_source_program_symbol_table(file.read())
+    with Corpus_Columns(location) as corpus:
+        assert corpus.header == header
+        assert len(corpus["symbols.name"]) == len(symbol_table)
+        assert set(corpus["symbols.file"]) == {0}
+        for row, name in enumerate(corpus["symbols.name"]):
+            entry = symbol_table[corpus.names[name]]
+            assert corpus.symbol_kinds[corpus["symbols.kind"][row]] == entry["type"]
+            assert corpus["symbols.line"][row] == entry["line"]
+            assert corpus["symbols.start_pos"][row] == entry["start_pos"]
+        names = [corpus.names[name] for name in corpus["functions.name"]]
+        assert names == ["main", "char", "convert"]
+        node_counts = corpus["functions.node_counts"]
+        assert node_counts.shape == (3, len(corpus.node_kinds))
+        assert [sum(row) for row in node_counts.tolist()] == list(
+            corpus["functions.nodes"]
+        )
+        convert = node_counts.tolist()[2]
+        assert convert[corpus.node_kinds.index("function_expression")] == 2
+
+
+def test_watcher(tmp_path, monkeypatch) -> None:
+    import contextlib
+    import io
+    import json
+    import os
+
+    source, output = tmp_path / "source", tmp_path / "output"
+    (source / "lib").mkdir(parents=True)
+    (source / "main.b").write_text("main() {\n  x = 1;\n}\n")
+    (source / "lib" / "add.b").write_text("add(a, b) {\n  return (a + b);\n}\n")
+    watcher = Watcher(str(source), symbols=True)
+    assert sorted(e["path"] for e in watcher.scan()) == [
+        str(source / "lib" / "add.b"),
+        str(source / "main.b"),
+    ]
+    assert watcher.scan() == []
+
+    (source / "main.b").write_text("main() {\n  y = 1;\n}\n")
+    os.utime(source / "main.b", ns=(0, 0))
+    [event] = watcher.scan()
+    assert event["event"] == "changed" and list(event["symbols"]) == ["y", "main"]
+
+    (source / "main.b").write_text("int main() {}")
+    [event] = watcher.scan()
+    assert event["event"] == "error" and event["diagnostics"][0]["line"] == 1
+    assert watcher.results[str(source / "main.b")] is event
+
+    (source / "main.b").unlink()
+    assert watcher.scan() == [{"path": str(source / "main.b"), "event": "removed"}]
+
+    stream = io.StringIO()
+    Watcher(str(source), output=str(output)).run(stream=stream, polls=2)
+    assert stream.getvalue() == f"changed {source / 'lib' / 'add.b'}\n"
+    with open(output / "lib" / "add.b.json") as file:
+        assert json.load(file)["ast"]["left"][0]["root"] == "add"
+
+    # a file deleted between the listing and its stat is not an error
+    scandir = os.scandir
+
+    def scandir_then_delete(directory):
+        with scandir(directory) as listing:
+            entries = list(listing)
+        for entry in entries:
+            if entry.name == "add.b":
+                os.unlink(entry.path)
+        return contextlib.nullcontext(entries)
+
+    watcher = Watcher(str(source))
+    assert len(watcher.scan()) == 1
+    (source / "lib" / "add.b").write_text("add(a, b) {\n  return (a - b);\n}\n")
+    os.utime(source / "lib" / "add.b", ns=(0, 0))
+    monkeypatch.setattr(os, "scandir", scandir_then_delete)
+    assert watcher.scan() == []
+    monkeypatch.undo()
+    assert watcher.scan() == [{"path": str(source / "lib" / "add.b"), "event": "removed"}]
+    assert Watcher(str(tmp_path / "missing")).scan() == []
+
+
+def test_tokenize_source_program() -> None:
+    import mmap
+
+    source = "init: x = c ? 'a'\n  : ' '; /* y */ goto init;"
+    tokens = list(tokenize_source_program(source, comments=True))
+    assert [(t.kind, t.value) for t in tokens] == [
+        ("LABEL", "init:"),
+        ("NAME", "x"),
+        ("EQUAL", "="),
+        ("NAME", "c"),
+        ("QMARK", "?"),
+        ("CHAR_CONSTANT", "'a'"),
+        ("COLON", ":"),
+        ("CHAR_CONSTANT", "' '"),
+        ("SEMI_COLON", ";"),
+        ("C_COMMENT", "/* y */"),
+        ("GOTO", "goto"),
+        ("NAME", "init"),
+        ("SEMI_COLON", ";"),
+    ]
+    assert tokens[6][2:] == (source.index(":", 10), 2, 3)
+
+    # a name before the ':' of a nested ternary is not a label
+    nested = "main() { z = a ? b ? c : d : e; switch (z) { case 1: f: ; } }"
+    parse_source_program(nested)
+    values = " ".join(t.value for t in tokenize_source_program(nested))
+    assert "a ? b ? c : d : e ; switch ( z ) { case 1 : f: ;" in values
+    assert "C_COMMENT" not in [t.kind for t in tokenize_source_program(source)]
+
+    with open(getcwd() + "/examples/2.b", "rb") as file:
+        mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        from_mmap = list(tokenize_source_program(mapped))
+        mapped.close()
+    with open(getcwd() + "/examples/2.b") as file:
+        assert list(tokenize_source_program(file)) == from_mmap
+    assert [t.kind for t in from_mmap[:4]] == ["NAME", "LPAR", "NAME", "COMMA"]
+    assert from_mmap[0][2:] == (633, 17, 1)
+
+    with pytest.raises(Syntax_Error):
+        list(tokenize_source_program("main() { x = \u00e9; }"))